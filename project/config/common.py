@@ -221,6 +221,71 @@ class Common(Configuration):
         'LOGOUT_URL': '/api-auth/logout/'
     }
 
+    # Maximum age in seconds of the in-memory KmGrid index used to locate reports.
+    # Grids imported by another process are picked up after this delay.
+    GRID_INDEX_TTL = config('GRID_INDEX_TTL', default=300, cast=int)
+
+    # Maximum age in seconds of the in-memory status colors.
+    # Statuses saved by another process are picked up after this delay.
+    STATUS_CACHE_TTL = config('STATUS_CACHE_TTL', default=300, cast=int)
+
+    # Seconds a /status/ response can be cached by clients
+    STATUS_MAX_AGE = config('STATUS_MAX_AGE', default=300, cast=int)
+
+    # How ReportViewSet.create stores reports:
+    # 'sync' creates the Report in the request,
+    # 'queue' only queues it, to be applied in batches by `process_report_queue`.
+    REPORT_INGESTION_MODE = config('REPORT_INGESTION_MODE', default='sync')
+
+    # Seconds a /grid-score/tiles/ tile can be cached, by minimum zoom level.
+    # Low zoom tiles summarize large areas and change less visibly.
+    GRID_SCORE_TILE_MAX_AGE = {
+        0: 3600,
+        8: 600,
+        12: 60,
+    }
+
+    # Maximum number of reports accepted by one /report/bulk/ request
+    REPORT_BULK_MAX_SIZE = config('REPORT_BULK_MAX_SIZE', default=5000, cast=int)
+
+    # Default number of decimal digits of GeoJSON coordinates built by PostgreSQL
+    GEOJSON_PRECISION = config('GEOJSON_PRECISION', default=6, cast=int)
+
+    # Number of rows fetched at a time from the server-side cursor of streamed GeoJSON
+    GEOJSON_STREAM_CHUNK_SIZE = config('GEOJSON_STREAM_CHUNK_SIZE', default=2000, cast=int)
+
+    # Caches
+    # Grid score tiles and responses are shared by every worker and the cron jobs
+    # that invalidate them, so their cache must not be per process.
+    # Each report sets the version of the tiles covering its grid, so the backend
+    # must not cull on writes like the file and database backends do.
+    # Memcached evicts the least recently used entries by itself.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'grid_score': {
+            'BACKEND': config(
+                'GRID_SCORE_CACHE_BACKEND',
+                default='django.core.cache.backends.memcached.MemcachedCache'
+            ),
+            'LOCATION': config('GRID_SCORE_CACHE_LOCATION', default='127.0.0.1:11211'),
+            'TIMEOUT': config('GRID_SCORE_CACHE_TIMEOUT', default=3600, cast=int),
+        },
+    }
+    GRID_SCORE_CACHE = 'grid_score'
+
+    # Tiles up to this zoom level are cached. Deeper tiles are cheap to render,
+    # and too many to invalidate on each report.
+    GRID_SCORE_TILE_CACHE_MAX_ZOOM = config('GRID_SCORE_TILE_CACHE_MAX_ZOOM', default=14, cast=int)
+
+    # Above this number of changed grids, the whole grid score cache is invalidated
+    GRID_SCORE_CACHE_MAX_EXTENTS = config('GRID_SCORE_CACHE_MAX_EXTENTS', default=1000, cast=int)
+
+    # Seconds during which grid score changes are coalesced in one pushed event,
+    # see the serve_grid_score_push command
+    GRID_SCORE_PUSH_WINDOW = config('GRID_SCORE_PUSH_WINDOW', default=1.0, cast=float)
+
     # Django Crontab settings
     CRONJOBS = [
         (
@@ -230,5 +295,13 @@ class Common(Configuration):
         (
             '1 0 * * *',
             'project.report.cron.auto_generate_grid_score',
+        ),
+        (
+            '* * * * *',
+            'project.report.cron.auto_process_report_queue',
+        ),
+        (
+            '* * * * *',
+            'project.report.cron.auto_process_grid_import',
         )
     ]
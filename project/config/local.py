@@ -19,6 +19,17 @@ class Local(Common):
         '--cover-package=project'
     ]
 
+    # Caches
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'grid_score': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'grid_score',
+        },
+    }
+
     # Mail
     EMAIL_HOST = 'localhost'
     EMAIL_PORT = 1025
@@ -1,13 +1,14 @@
 from django.contrib import admin
 from django.shortcuts import render, redirect
-from django.urls import path
+from django.urls import path, reverse
 from leaflet.admin import LeafletGeoAdmin
 from .forms import FileImportForm
 from .models.status import Status
 from .models.report import Report
 from .models.km_grid import KmGrid
 from .models.km_grid_score import KmGridScore
-from .management.commands.import_grid import check_json_loadable, check_geojson_loadable, loop_geojson
+from .models.grid_import_job import GridImportJob
+from .utils.grid_score_cache import invalidate_grid_score_cache
 
 admin.site.site_header = 'How Am I Doing? Administration'
 
@@ -18,6 +19,18 @@ admin.site.register(Report, LeafletGeoAdmin)
 class KmGridScoreAdmin(LeafletGeoAdmin):
     list_filter = ('total_score',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_grid_score_cache()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_grid_score_cache()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_grid_score_cache()
+
 @admin.register(KmGrid)
 class KmGridAdmin(LeafletGeoAdmin):
     change_list_template = "admin/kmgrid_change_list.html"
@@ -30,25 +43,50 @@ class KmGridAdmin(LeafletGeoAdmin):
         return my_urls + urls
 
     def import_geojson(self, request):
+        """
+        Save the uploaded GeoJSON file and queue it for import in the background.
+        """
         if request.method == "POST":
             geojson_file = request.FILES["file"]
-            content = geojson_file.read()
-            is_json, json_data = check_json_loadable(content)
-
-            if is_json:
-                is_geojson, geojson_data = check_geojson_loadable(json_data)
-                if is_geojson:
-                    loop_geojson(geojson_data)
-                    self.message_user(request, "Your GEOJSON file has been imported")
-                else:
-                    self.message_user(request, "File is not a GEOJSON file.")
-            else:
+            # Only the beginning is checked here, the file is validated while importing
+            if not geojson_file.read(1024).lstrip().startswith(b'{'):
                 self.message_user(request, 'File is not a JSON file.')
+                return redirect("..")
+            geojson_file.seek(0)
 
-            return redirect("..")
+            job = GridImportJob.objects.create(file=geojson_file, size=geojson_file.size)
+            self.message_user(request, "Your GEOJSON file has been queued for import")
+            return redirect(reverse('admin:report_gridimportjob_change', args=[job.id]))
 
         form = FileImportForm()
         payload = {"form": form}
         return render(
             request, "admin/file_import_form.html", payload
         )
+
+
+@admin.register(GridImportJob)
+class GridImportJobAdmin(admin.ModelAdmin):
+    change_form_template = "admin/gridimportjob_change_form.html"
+    list_display = ('id', 'file', 'status', 'processed', 'imported', 'errors', 'rate_display', 'eta_display')
+    list_filter = ('status',)
+    readonly_fields = (
+        'file', 'size', 'status', 'bytes_read', 'processed', 'imported', 'errors',
+        'rate_display', 'eta_display', 'message', 'timestamp', 'started_at', 'updated_at', 'finished_at'
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def rate_display(self, obj):
+        if obj.rate is None:
+            return '-'
+        return f'{obj.rate:.0f} features/s'
+    rate_display.short_description = 'Rate'
+
+    def eta_display(self, obj):
+        if obj.eta is None:
+            return '-'
+        minutes, seconds = divmod(int(obj.eta), 60)
+        return f'{minutes}m {seconds}s'
+    eta_display.short_description = 'ETA'
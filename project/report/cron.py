@@ -1,6 +1,8 @@
 from .models import Report, Status
 from django.utils import timezone
-from .management.commands.generate_grid_score import generate_grid_score
+from .management.commands.generate_grid_score import generate_grid_score_bulk
+from .management.commands.process_report_queue import process_report_queue
+from .management.commands.process_grid_import import process_grid_import_jobs
 
 def auto_revert_status_to_all_well_here():
     """
@@ -31,4 +33,16 @@ def auto_generate_grid_score():
     """
     Automatically generate KmGridScore every night
     """
-    generate_grid_score()
+    generate_grid_score_bulk()
+
+def auto_process_report_queue():
+    """
+    Apply queued reports every minute
+    """
+    process_report_queue()
+
+def auto_process_grid_import():
+    """
+    Import GeoJSON files uploaded in the admin page
+    """
+    process_grid_import_jobs()
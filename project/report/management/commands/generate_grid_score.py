@@ -3,30 +3,62 @@ __author__ = 'zakki@kartoza.com'
 from project.report.models.km_grid import KmGrid
 from project.report.models.km_grid_score import KmGridScore
 from project.report.models.report import Report
+from project.report.models.status import status_colors
+from project.report.utils.batches import chunked
+from project.report.utils.grid_score_cache import invalidate_grid_score_cache
+from project.report.utils.scoring_grid import round_score, score_km_grid_batch
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+COLORS = ('green', 'yellow', 'red')
+
 
 class Command(BaseCommand):
     """
     Base command to generate KmGridScore from KmGrid and Report
     """
+
+    def add_arguments(self, parser):
+        """ Define arguments for the command """
+        parser.add_argument(
+            '--bulk',
+            dest='bulk',
+            action='store_true',
+            help='Count reports with one aggregate query and write grid scores in bulk',
+        )
+        parser.add_argument(
+            '--rescore',
+            dest='rescore',
+            action='store_true',
+            help='With --bulk, also recalculate existing grid scores',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=1000,
+            help='With --bulk, number of grid scores written per query',
+        )
+
     def handle(self, **options):
-        generate_grid_score()
+        if options['bulk']:
+            generate_grid_score_bulk(options['chunk_size'], options['rescore'])
+        else:
+            generate_grid_score()
+
 
 def generate_grid_score():
     """
     Generate KmGridScore from KmGrid and Report
     """
 
-    # Query all grid score
-    grid_score = KmGridScore.objects.all().values('geometry')
-
-    # Query all grids
-    grids = KmGrid.objects.exclude(geometry__in=grid_score)
+    # Query all grids without grid score
+    grids = KmGrid.objects.filter(grid_score__isnull=True)
 
     print(f'--- Inserting {grids.count()} Grid Scores ---')
 
@@ -39,7 +71,7 @@ def generate_grid_score():
         red_report = grid_report.red_report()
 
         # Create KmGridScore object
-        grid_score, _ = KmGridScore.objects.get_or_create(geometry=grid.geometry)
+        grid_score, _ = KmGridScore.objects.get_or_create(grid=grid, defaults={'geometry': grid.geometry})
         grid_score.population = grid.population
         grid_score.count_green = green_report.count()
         grid_score.count_yellow = yellow_report.count()
@@ -55,4 +87,118 @@ def generate_grid_score():
         if num % 50 == 0 and num > 0:
             print(f'{num} Grid Scores Inserted ')
 
+    invalidate_grid_score_cache()
     print(f'-- {grids.count()} Grid Scores Inserted --')
+
+
+def count_report_by_grid():
+    """
+    Count current reports of each color in every grid with one aggregate query.
+
+    ::return :: {grid ID: {color: count}}
+    ::return type :: dict
+    """
+    colors = status_colors()
+
+    report_count = Report.current_objects.filter(
+        grid__isnull=False
+    ).values('grid_id', 'status_id').annotate(total=Count('id')).order_by()
+
+    counts = {}
+    for row in report_count:
+        color = colors.get(row['status_id'])
+        if color is not None:
+            grid_count = counts.setdefault(row['grid_id'], dict.fromkeys(COLORS, 0))
+            grid_count[color] += row['total']
+    return counts
+
+
+def score_grid(grid_scores, grid_counts):
+    """
+    Set counts and scores of KmGridScores without saving them.
+    All grids are scored with one vectorized call.
+    """
+    if not grid_scores:
+        return
+
+    counts = {
+        color: [grid_count[color] for grid_count in grid_counts] for color in COLORS
+    }
+    scores = score_km_grid_batch(
+        counts['green'],
+        counts['yellow'],
+        counts['red'],
+        [grid_score.population for grid_score in grid_scores],
+    )
+    scores = {field: values.tolist() for field, values in scores.items()}
+
+    for num, grid_score in enumerate(grid_scores):
+        for color in COLORS:
+            setattr(grid_score, f'count_{color}', counts[color][num])
+            setattr(grid_score, f'score_{color}', round_score(scores[f'score_{color}'][num]))
+        grid_score.total_report = sum(counts[color][num] for color in COLORS)
+        grid_score.total_score = scores['total_score'][num]
+
+
+def generate_grid_score_bulk(chunk_size=1000, rescore=False):
+    """
+    Generate KmGridScore from KmGrid and Report in bulk.
+    Reports are counted with a single GROUP BY query, then grid scores
+    are created (and updated when `rescore` is True) in chunks.
+    Gives the same numbers as generate_grid_score.
+    """
+    counts = count_report_by_grid()
+    empty_count = dict.fromkeys(COLORS, 0)
+
+    grid_score_ids = dict(
+        KmGridScore.objects.filter(grid__isnull=False).values_list('grid_id', 'id').iterator()
+    )
+    grids = KmGrid.objects.values_list('id', 'geometry', 'population').order_by('id')
+
+    print(f'--- Inserting {grids.count() - len(grid_score_ids)} Grid Scores ---')
+
+    created = 0
+    updated = 0
+    for chunk in chunked(grids.iterator(chunk_size=chunk_size), chunk_size):
+        grid_scores = []
+        grid_counts = []
+        new_grid_scores = []
+        existing_grid_scores = []
+        for grid_id, geometry, population in chunk:
+            grid_score_id = grid_score_ids.get(grid_id)
+            if grid_score_id is not None and not rescore:
+                continue
+
+            grid_score = KmGridScore(
+                id=grid_score_id,
+                grid_id=grid_id,
+                geometry=geometry,
+                population=population
+            )
+            grid_scores.append(grid_score)
+            grid_counts.append(counts.get(grid_id, empty_count))
+            if grid_score_id is None:
+                new_grid_scores.append(grid_score)
+            else:
+                existing_grid_scores.append(grid_score)
+
+        score_grid(grid_scores, grid_counts)
+
+        with transaction.atomic():
+            KmGridScore.objects.bulk_create(new_grid_scores)
+            KmGridScore.objects.bulk_update(
+                existing_grid_scores,
+                ['population', 'total_report', 'total_score', *(
+                    f'{field}_{color}' for color in COLORS for field in ('count', 'score')
+                )]
+            )
+
+        created += len(new_grid_scores)
+        updated += len(existing_grid_scores)
+        if new_grid_scores:
+            print(f'{created} Grid Scores Inserted ')
+
+    invalidate_grid_score_cache()
+    if rescore:
+        print(f'-- {updated} Grid Scores Updated --')
+    print(f'-- {created} Grid Scores Inserted --')
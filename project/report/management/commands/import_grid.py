@@ -2,17 +2,123 @@ __author__ = 'zakki@kartoza.com'
 
 from django.core.management.base import BaseCommand
 from django.contrib.gis.geos import GEOSGeometry
+from django.db import connection, transaction
 from project.report.models.km_grid import KmGrid
+from project.report.models.km_grid_lattice import KmGridLattice
+from project.report.models.km_grid_score import KmGridScore
+from project.report.utils.batches import chunked
+from project.report.utils.geojson_stream import NotGeoJSONError, iter_feature_collection
+from project.report.utils.grid_formats import GEOJSON, GRID_FORMATS, GRID_READERS, GridFormatError, \
+    detect_format
+from project.report.utils.grid_index import invalidate_grid_index
+from project.report.utils.grid_lattice import rectangle_extent
+from project.report.utils.grid_score_cache import invalidate_grid_score_cache
+from collections import deque
+import io
+import multiprocessing
 import os
 import json
+import time
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Top level members accepted in a GeoJSON file
+GEOJSON_KEYS = ['type', 'features', 'name', 'crs']
+
+IMPORT_METHODS = ('insert', 'copy', 'upsert')
+
+STAGING_TABLE = 'report_kmgrid_staging'
+
+STAGING_TABLE_SQL = f'''
+DROP TABLE IF EXISTS {STAGING_TABLE};
+CREATE TEMPORARY TABLE {STAGING_TABLE} (
+    num bigserial,
+    geometry geometry(Polygon, 4326),
+    population integer,
+    lattice_id integer,
+    lattice_row integer,
+    lattice_col integer,
+    grid_id integer
+) ON COMMIT DROP
+'''
+
+STAGING_COPY_SQL = (
+    f'COPY {STAGING_TABLE} (geometry, population, lattice_id, lattice_row, lattice_col) '
+    'FROM STDIN'
+)
+
+# Insert staged grids in file order, skipping geometries already in the
+# grid table or repeated in the file (the first one is kept)
+STAGING_MERGE_SQL = f'''
+INSERT INTO {{table}} (geometry, population)
+SELECT geometry, population FROM (
+    SELECT DISTINCT ON (ST_AsEWKB(staging.geometry)) staging.*
+    FROM {STAGING_TABLE} staging
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {{table}} grid
+        WHERE grid.geometry ~= staging.geometry
+        AND ST_Equals(grid.geometry, staging.geometry)
+    )
+    ORDER BY ST_AsEWKB(staging.geometry), staging.num
+) deduplicated
+ORDER BY num
+'''
+
+# Match staged grids to existing grids by geometry hash (see the
+# report_kmgrid_geometry_hash index), then by lattice row and column
+STAGING_MATCH_SQL = f'''
+UPDATE {STAGING_TABLE} staging SET grid_id = grid.id
+FROM {{table}} grid
+WHERE md5(ST_AsEWKB(grid.geometry)) = md5(ST_AsEWKB(staging.geometry));
+
+UPDATE {STAGING_TABLE} staging SET grid_id = grid.id
+FROM {{table}} grid
+WHERE staging.grid_id IS NULL
+AND grid.lattice_id = staging.lattice_id
+AND grid.lattice_row = staging.lattice_row
+AND grid.lattice_col = staging.lattice_col;
+
+CREATE INDEX ON {STAGING_TABLE} (grid_id);
+ANALYZE {STAGING_TABLE}
+'''
+
+# Update population of matched grids when it changed
+STAGING_UPDATE_SQL = f'''
+UPDATE {{table}} grid SET population = staged.population
+FROM (
+    SELECT DISTINCT ON (grid_id) grid_id, population
+    FROM {STAGING_TABLE}
+    WHERE grid_id IS NOT NULL
+    ORDER BY grid_id, num
+) staged
+WHERE grid.id = staged.grid_id AND grid.population <> staged.population
+RETURNING grid.id
+'''
+
+STAGING_MATCHED_SQL = f'SELECT count(DISTINCT grid_id) FROM {STAGING_TABLE}'
+
+STAGING_MISSING_SQL = f'''
+SELECT grid.id FROM {{table}} grid
+WHERE NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} staging WHERE staging.grid_id = grid.id)
+'''
+
+# Insert staged grids without a match, in file order
+STAGING_INSERT_SQL = f'''
+INSERT INTO {{table}} (geometry, population)
+SELECT geometry, population FROM (
+    SELECT DISTINCT ON (ST_AsEWKB(staging.geometry)) staging.*
+    FROM {STAGING_TABLE} staging
+    WHERE staging.grid_id IS NULL
+    ORDER BY ST_AsEWKB(staging.geometry), staging.num
+) unmatched
+ORDER BY num
+'''
+
 
 class Command(BaseCommand):
-    help = 'This script is for creating KmGrid object from GEOJSON file. \n' \
+    help = 'This script is for creating KmGrid object from GEOJSON, FlatGeobuf, GeoParquet or CSV file. \n' \
         'Usage: \n' \
         '--file /path/to/file/location/file.geojson'
 
@@ -21,7 +127,43 @@ class Command(BaseCommand):
         parser.add_argument(
             '--file',
             dest='file',
-            help='Location of GEOJSON file',
+            help='Location of grid file',
+        )
+        parser.add_argument(
+            '--format',
+            dest='format',
+            choices=GRID_FORMATS,
+            default=None,
+            help='Format of grid file, detected from the file when not given',
+        )
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=1000,
+            help='Number of grids inserted per query',
+        )
+        parser.add_argument(
+            '--method',
+            dest='method',
+            choices=IMPORT_METHODS,
+            default='insert',
+            help='insert: batched INSERT queries. '
+                 'copy: COPY into a staging table, then merge grids with new geometries. '
+                 'upsert: like copy, but also update population of existing grids',
+        )
+        parser.add_argument(
+            '--delete-missing',
+            dest='delete_missing',
+            action='store_true',
+            help='With --method upsert, delete grids missing from the file, with their reports',
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers',
+            type=int,
+            default=1,
+            help='Number of processes building grid geometries from the features',
         )
 
     def handle(self, **options):
@@ -32,12 +174,53 @@ class Command(BaseCommand):
         try:
             if options['file']:
                 file_loc = os.path.abspath(options['file'])
-                import_grid_from_geojson(file_loc)
+                import_grid_from_file(
+                    file_loc, options['batch_size'], options['method'], options['workers'], options['format'],
+                    options['delete_missing']
+                )
 
         except Exception as e:
             print(e)
 
-def import_grid_from_geojson(file_path):
+def import_grid_from_file(file_path, batch_size=1000, method='insert', workers=1, file_format=None,
+                          delete_missing=False):
+    """
+    Import KmGrid from a GeoJSON, FlatGeobuf, GeoParquet or CSV file.
+    Every format is loaded by the same batched insert or copy path.
+    """
+    if check_path_exist_and_is_file(file_path) and file_format is None:
+        file_format = detect_format(file_path)
+    if file_format in (None, GEOJSON):
+        return import_grid_from_geojson(file_path, batch_size, method, workers, delete_missing)
+
+    print('Importing KmGrid from {} ({})'.format(file_path, file_format))
+    try:
+        result = load_features(
+            GRID_READERS[file_format](file_path), batch_size, method, workers, delete_missing=delete_missing
+        )
+    except GridFormatError as e:
+        print(e)
+        print('Stopping import process.')
+        return
+    except Exception as e:
+        print(e)
+        print(f'File is not a valid {file_format} file.')
+        return
+
+    print('Imported {}/{} ({})'.format(
+        result[0],
+        result[1],
+        (result[0]/max(result[1], 1))/100
+    )
+    )
+
+
+def import_grid_from_geojson(file_path, batch_size=1000, method='insert', workers=1, delete_missing=False):
+    """
+    Import KmGrid from a GeoJSON file.
+    The file is read as a stream, so memory use does not grow with its size.
+    Method is 'insert', 'copy' or 'upsert'.
+    """
     print('Importing KmGrid from {}'.format(file_path))
     print('Checking whether file exists')
 
@@ -45,23 +228,24 @@ def import_grid_from_geojson(file_path):
         print('File exists!')
         print('Check and load GEOJSON.')
 
-        content = read_local_file(file_path)
-        is_json, json_data = check_json_loadable(content)
-        if is_json:
-            is_geojson, geojson_data = check_geojson_loadable(json_data)
-            if is_geojson:
-                print("Valid GEOJSON file! Inserting KmGrid.")
-                result = loop_geojson(geojson_data)
-                print('Imported {}/{} ({})'.format(
-                    result[0],
-                    result[1],
-                    (result[0]/result[1])/100
-                )
-                )
-            else:
+        with open(file_path, 'r') as f:
+            try:
+                result = load_geojson_stream(f, batch_size, method, workers, delete_missing=delete_missing)
+            except json.JSONDecodeError as e:
+                print(e)
+                print('File is not a JSON file.')
+                return
+            except NotGeoJSONError as e:
+                print(e)
                 print('File is not a GEOJSON file.')
-        else:
-            print('File is not a JSON file.')
+                return
+
+        print('Imported {}/{} ({})'.format(
+            result[0],
+            result[1],
+            (result[0]/max(result[1], 1))/100
+        )
+        )
     else:
         print('File does not exist or path is not a file!')
         print('Stopping import process.')
@@ -146,49 +330,319 @@ def check_geojson_loadable(json_data):
     """
     if type(json_data) != dict:
         return False, json_data
-    elif all(field in ['type', 'features', 'name', 'crs'] for field in json_data.keys()):
+    elif all(field in GEOJSON_KEYS for field in json_data.keys()):
         return True, json_data
     else:
         return False, json_data
 
-def loop_geojson(geojson_data):
+def geojson_stream_features(file):
+    """
+    Iterate over features of a GeoJSON file, checking the other members
+    the same way as check_geojson_loadable.
+    """
+    started = False
+    for key, value in iter_feature_collection(file):
+        if key not in GEOJSON_KEYS:
+            raise NotGeoJSONError(f'Unexpected member {key}')
+        if key == 'features':
+            if not started:
+                print("Valid GEOJSON file! Inserting KmGrid.")
+                started = True
+            yield value
+
+
+def load_geojson_stream(file, batch_size=1000, method='insert', workers=1, progress=None,
+                        delete_missing=False):
+    """
+    Stream features of a GeoJSON file into KmGrid in batches.
+    `progress` is called after each batch, see insert_grids.
+
+    ::return :: (created grids, features read)
+    ::return type :: (integer, integer)
+    """
+    return load_features(geojson_stream_features(file), batch_size, method, workers, progress, delete_missing)
+
+
+def load_features(features, batch_size=1000, method='insert', workers=1, progress=None,
+                  delete_missing=False):
+    """
+    Load features of any grid format into KmGrid in batches, then detect the lattice.
+    With the insert method, grids inserted before an error in the file are kept.
+    With the copy and upsert methods, the file is imported in a single transaction.
+
+    ::return :: (created or matched grids, features read)
+    ::return type :: (integer, integer)
+    """
+    try:
+        if method == 'upsert':
+            return upsert_grids(features, batch_size, workers, progress, delete_missing)
+        if method == 'copy':
+            return copy_grids(features, batch_size, workers, progress)
+        return insert_grids(features, batch_size, workers, progress)
+    finally:
+        KmGrid.objects.assign_lattice()
+        invalidate_grid_index()
+
+
+def loop_geojson(geojson_data, batch_size=1000):
+    """
+    Loop GeoJSON and insert grids in batches
+    """
+    result = insert_grids(geojson_data['features'], batch_size)
+
+    KmGrid.objects.assign_lattice()
+    invalidate_grid_index()
+    return result
+
+
+def insert_grids(features, batch_size=1000, workers=1, progress=None):
+    """
+    Insert KmGrid from GeoJSON features, one bulk INSERT per batch.
+    Only a few batches of features are kept in memory.
+
+    ::params::
+    features : iterable of GeoJSON features
+    batch_size : number of grids inserted per query
+    workers : number of processes building the grids
+    progress : callable receiving (features read, created grids) after each batch
+
+    ::return :: (created grids, features read)
+    ::return type :: (integer, integer)
+    """
+    created_object = 0
+    total = 0
+    started_at = time.monotonic()
+    for features_count, grids in prepare_batches(features, batch_size, workers):
+        total += features_count
+        created_object += save_grids(grids)
+
+        rate = total / max(time.monotonic() - started_at, 1e-6)
+        print(f'{total} features read, {created_object} KmGrid inserted ({rate:.0f} features/s)')
+        if progress is not None:
+            progress(total, created_object)
+
+    return created_object, total
+
+
+def copy_grids(features, batch_size=1000, workers=1, progress=None):
+    """
+    Load KmGrid from GeoJSON features with COPY FROM STDIN.
+    Grids are streamed as EWKB into a temporary staging table, one COPY per batch,
+    then inserted into KmGrid with a single query skipping existing geometries.
+
+    ::params::
+    features : iterable of GeoJSON features
+    batch_size : number of grids sent per COPY
+    workers : number of processes building the grids
+    progress : callable receiving (features read, staged grids) after each batch
+
+    ::return :: (created grids, features read)
+    ::return type :: (integer, integer)
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        staged, total = stage_grids(cursor, features, batch_size, workers, progress)
+        cursor.execute(STAGING_MERGE_SQL.format(table=connection.ops.quote_name(KmGrid._meta.db_table)))
+        created_object = cursor.rowcount
+
+    print(f'{created_object} KmGrid inserted, {staged - created_object} duplicated geometries skipped')
+    return created_object, total
+
+
+def upsert_grids(features, batch_size=1000, workers=1, progress=None, delete_missing=False):
+    """
+    Import a new release of the grids, without duplicating existing ones.
+    Grids are staged like copy_grids, then matched to existing grids by geometry hash,
+    or by row and column for grids in a lattice. Matched grids get the new population
+    when it changed, unmatched grids are inserted, and grids missing from the file are
+    deleted when `delete_missing` is True. Scores of grids whose population changed
+    are recalculated from their counts.
+
+    ::return :: (created or matched grids, features read)
+    ::return type :: (integer, integer)
+    """
+    table = connection.ops.quote_name(KmGrid._meta.db_table)
+    lattices = {
+        km_grid_lattice.id: km_grid_lattice.as_lattice()
+        for km_grid_lattice in KmGridLattice.objects.all()
+    }
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        staged, total = stage_grids(cursor, features, batch_size, workers, progress, lattices)
+        cursor.execute(STAGING_MATCH_SQL.format(table=table))
+
+        cursor.execute(STAGING_UPDATE_SQL.format(table=table))
+        updated_ids = [grid_id for grid_id, in cursor.fetchall()]
+        cursor.execute(STAGING_MATCHED_SQL)
+        matched = cursor.fetchone()[0]
+
+        deleted = 0
+        if delete_missing:
+            cursor.execute(STAGING_MISSING_SQL.format(table=table))
+            missing_ids = [grid_id for grid_id, in cursor.fetchall()]
+            for ids in chunked(missing_ids, batch_size):
+                KmGrid.objects.filter(id__in=ids).delete()
+            deleted = len(missing_ids)
+
+        cursor.execute(STAGING_INSERT_SQL.format(table=table))
+        created_object = cursor.rowcount
+
+        for ids in chunked(updated_ids, batch_size):
+            KmGridScore.objects.filter(grid_id__in=ids).rescore_population()
+        if updated_ids or deleted:
+            transaction.on_commit(invalidate_grid_score_cache)
+
+    print(
+        f'{created_object} KmGrid inserted, {len(updated_ids)} updated, '
+        f'{matched - len(updated_ids)} unchanged, {deleted} deleted'
+    )
+    return created_object + matched, total
+
+
+def stage_grids(cursor, features, batch_size=1000, workers=1, progress=None, lattices=None):
+    """
+    Stream grids built from the features into the staging table, one COPY per batch.
+    The staging table is dropped at the end of the transaction.
+    When `lattices` ({lattice ID: Lattice}) is given, the lattice cell of each grid is staged too.
+
+    ::return :: (staged grids, features read)
+    ::return type :: (integer, integer)
     """
-    Loop GeoJSON and call function to create grid
+    staged = 0
+    total = 0
+    started_at = time.monotonic()
+    cursor.execute(STAGING_TABLE_SQL)
+
+    for features_count, grids in prepare_batches(features, batch_size, workers):
+        total += features_count
+        rows = io.StringIO()
+        for grid in grids:
+            lattice_id, row, column = lattice_cell(grid.geometry, lattices)
+            rows.write(
+                f'{grid.geometry.hexewkb.decode()}\t{int(grid.population)}\t{lattice_id}\t{row}\t{column}\n'
+            )
+        staged += len(grids)
+        rows.seek(0)
+        cursor.copy_expert(STAGING_COPY_SQL, rows)
+
+        rate = total / max(time.monotonic() - started_at, 1e-6)
+        print(f'{total} features read, {staged} KmGrid staged ({rate:.0f} features/s)')
+        if progress is not None:
+            progress(total, staged)
+
+    return staged, total
+
+
+def lattice_cell(geometry, lattices=None):
     """
+    (lattice ID, row, column) of the lattice cell equal to the geometry,
+    as COPY text values, NULL if there is none.
+    """
+    extent = rectangle_extent(geometry) if lattices else None
+    if extent is not None:
+        for lattice_id, lattice in lattices.items():
+            cell = lattice.cell_of_extent(*extent)
+            if cell is not None:
+                return (lattice_id,) + cell
+    return '\\N', '\\N', '\\N'
+
+
+def prepare_grids(features_batch):
+    """
+    Build valid unsaved grids from a batch of GeoJSON features.
+    Runs in the worker processes when importing with several workers.
+    """
+    grids = []
+    for grid in map(grid_from_feature, features_batch):
+        if grid is None:
+            continue
+        if grid.geometry.geom_type != 'Polygon':
+            print(f'Skipping {grid.geometry.geom_type}, grid geometry must be a Polygon')
+            continue
+        if grid.geometry.srid is None:
+            grid.geometry.srid = 4326
+        grids.append(grid)
+    return grids
+
+
+def prepare_batches(features, batch_size=1000, workers=1):
+    """
+    Split features into batches and build their grids, in a pool of
+    `workers` processes when more than one. Batches are returned in
+    file order, so the result is the same as with a single process.
+    At most two batches per worker are pending, to keep memory flat.
+
+    ::return :: (features in the batch, grids) for each batch
+    ::return type :: generator of (integer, list of KmGrid)
+    """
+    batches = chunked(features, batch_size)
+    if workers <= 1:
+        for features_batch in batches:
+            yield len(features_batch), prepare_grids(features_batch)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for features_batch in batches:
+            pending.append((len(features_batch), pool.apply_async(prepare_grids, (features_batch,))))
+            if len(pending) >= workers * 2:
+                features_count, result = pending.popleft()
+                yield features_count, result.get()
+        while pending:
+            features_count, result = pending.popleft()
+            yield features_count, result.get()
+
+
+def save_grids(grids):
+    """
+    Insert grids with a single query.
+    If it fails, grids are inserted one by one so only invalid grids are skipped.
+    """
+    try:
+        with transaction.atomic():
+            KmGrid.objects.bulk_create(grids)
+        return len(grids)
+    except Exception as e:
+        print(e)
+
     created_object = 0
-    for grid in geojson_data['features']:
-        grid = create_single_grid_from_features(grid)
-        if grid is not None:
+    for grid in grids:
+        try:
+            with transaction.atomic():
+                grid.save()
             created_object += 1
+        except Exception as e:
+            print(e)
+    return created_object
 
-    return(created_object, len(geojson_data['features']))
 
-def create_single_grid_from_features(grid):
+def grid_from_feature(grid):
     """
-    Create single grid based on single GeoJSON object
+    Build unsaved grid from single GeoJSON object.
+    Geometry can also be WKT or hex WKB string, or WKB bytes, see grid_feature.
     """
     try:
-        geometry = GEOSGeometry(str(grid['geometry']))
-    except KeyError as e:
+        geometry = grid['geometry']
+        if isinstance(geometry, dict):
+            geometry = json.dumps(geometry)
+        elif isinstance(geometry, bytes):
+            geometry = memoryview(geometry)
+        geometry = GEOSGeometry(geometry)
+    except Exception as e:
         print(e)
         return None
 
     try:
         population = grid['properties']['population_count']
+        if population is None:
+            print('population_count is null')
+            return None
         if population == 0:
             population = 1
     except KeyError as e:
         print(e)
         return None
 
-    try:
-        grid = KmGrid.objects.create(
-            geometry=geometry,
-            population=population
-        )
-        grid.save()
-    except Exception as e:
-        print(e)
-        return None
-
-    return grid
+    return KmGrid(
+        geometry=geometry,
+        population=population
+    )
@@ -0,0 +1,106 @@
+__author__ = 'zakki@kartoza.com'
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from project.report.models.grid_import_job import GridImportJob
+from project.report.utils.geojson_stream import NotGeoJSONError
+from .import_grid import load_geojson_stream
+import codecs
+import json
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Import GeoJSON files uploaded in the admin page. \n' \
+        'Usage: \n' \
+        '--batch-size 1000'
+
+    def add_arguments(self, parser):
+        """ Define arguments for the command """
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=1000,
+            help='Number of grids inserted per query',
+        )
+
+    def handle(self, **options):
+        process_grid_import_jobs(options['batch_size'])
+
+
+class ProgressFile(object):
+    """
+    Text reader over a binary file, counting the bytes read.
+    """
+
+    def __init__(self, file, encoding='utf-8'):
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        while True:
+            chunk = self.file.read(size)
+            self.bytes_read += len(chunk)
+            text = self.decoder.decode(chunk, final=not chunk)
+            # Keep reading when the chunk ends inside a multi-byte character
+            if text or not chunk:
+                return text
+
+
+def run_grid_import_job(job, batch_size=1000):
+    """
+    Import the file of a running GridImportJob, recording its progress after each batch.
+    """
+    def progress(processed, imported):
+        job.processed = processed
+        job.imported = imported
+        job.errors = processed - imported
+        job.bytes_read = progress_file.bytes_read
+        job.updated_at = timezone.now()
+        job.save(update_fields=['processed', 'imported', 'errors', 'bytes_read', 'updated_at'])
+
+    job.file.open('rb')
+    progress_file = ProgressFile(job.file)
+    try:
+        imported, processed = load_geojson_stream(progress_file, batch_size, progress=progress)
+        job.status = GridImportJob.DONE
+        job.message = f'Imported {imported}/{processed}'
+    except json.JSONDecodeError as e:
+        job.status = GridImportJob.FAILED
+        job.message = f'File is not a JSON file. {e}'
+    except NotGeoJSONError as e:
+        job.status = GridImportJob.FAILED
+        job.message = f'File is not a GEOJSON file. {e}'
+    except Exception as e:
+        logger.exception('Grid import job %s failed', job.id)
+        job.status = GridImportJob.FAILED
+        job.message = str(e)
+    finally:
+        job.file.close()
+
+    job.bytes_read = progress_file.bytes_read
+    job.finished_at = timezone.now()
+    job.updated_at = job.finished_at
+    job.save()
+    print(f'Grid import {job.id}: {job.message}')
+    return job
+
+
+def process_grid_import_jobs(batch_size=1000):
+    """
+    Run queued grid import jobs one after another until none is left.
+    :return: number of jobs run
+    """
+    count = 0
+    while True:
+        job = GridImportJob.objects.start_next()
+        if job is None:
+            break
+        run_grid_import_job(job, batch_size)
+        count += 1
+    return count
@@ -0,0 +1,61 @@
+__author__ = 'zakki@kartoza.com'
+
+from project.report.models.queued_report import QueuedReport
+from django.core.management.base import BaseCommand
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Apply queued reports in batches. \n' \
+        'Usage: \n' \
+        '--batch-size 1000 --loop --interval 1'
+
+    def add_arguments(self, parser):
+        """ Define arguments for the command """
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=1000,
+            help='Number of queued reports applied per transaction',
+        )
+        parser.add_argument(
+            '--loop',
+            dest='loop',
+            action='store_true',
+            help='Keep waiting for new queued reports',
+        )
+        parser.add_argument(
+            '--interval',
+            dest='interval',
+            type=float,
+            default=1.0,
+            help='With --loop, seconds to wait when the queue is empty',
+        )
+
+    def handle(self, **options):
+        while True:
+            applied = process_report_queue(options['batch_size'])
+            if not options['loop']:
+                break
+            if not applied:
+                time.sleep(options['interval'])
+
+
+def process_report_queue(batch_size=1000):
+    """
+    Apply queued reports in batches until the queue is empty.
+    :return: number of applied reports
+    """
+    applied = 0
+    while True:
+        batch = QueuedReport.objects.apply_batch(batch_size)
+        if not batch:
+            break
+        applied += batch
+        print(f'{applied} Queued Reports Applied')
+    return applied
@@ -0,0 +1,115 @@
+__author__ = 'zakki@kartoza.com'
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from project.report.models.km_grid_score import KmGridScore, changes_cursor
+from project.report.models.km_grid_score_deletion import KmGridScoreDeletion
+from project.report.utils.grid_score_push import EVENTS_PATH, GridScoreBroker, start_sse_server
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fields of a grid score sent in its change event
+CHANGE_FIELDS = ('id', 'count_green', 'count_yellow', 'count_red', 'total_report', 'total_score')
+
+
+class Command(BaseCommand):
+    help = 'Push grid score changes to clients with server-sent events, next to the WSGI app. \n' \
+        'Usage: \n' \
+        '--host 0.0.0.0 --port 8001 --window 1'
+
+    def add_arguments(self, parser):
+        """ Define arguments for the command """
+        parser.add_argument(
+            '--host',
+            dest='host',
+            default='0.0.0.0',
+            help='Address to listen on',
+        )
+        parser.add_argument(
+            '--port',
+            dest='port',
+            type=int,
+            default=8001,
+            help='Port to listen on',
+        )
+        parser.add_argument(
+            '--window',
+            dest='window',
+            type=float,
+            default=settings.GRID_SCORE_PUSH_WINDOW,
+            help='Seconds during which changes are coalesced in one event',
+        )
+
+    def handle(self, **options):
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(serve_grid_score_push(options['host'], options['port'], options['window']))
+
+
+def grid_score_changes(since, until):
+    """
+    Changes of grid scores committed from `since` up to `until` excluded,
+    deleted grid scores have `deleted` True.
+
+    ::return :: list of dict
+    """
+    close_old_connections()
+    changes = []
+    for change in KmGridScore.objects.changed_since(since, until).order_by('version').values(*CHANGE_FIELDS):
+        change['total_score'] = float(change['total_score'])
+        changes.append(change)
+    for grid_score_id in KmGridScoreDeletion.objects.filter(
+        version__gte=since, version__lt=until
+    ).values_list('grid_score_id', flat=True):
+        changes.append({'id': grid_score_id, 'deleted': True})
+    return changes
+
+
+def current_cursor():
+    close_old_connections()
+    return changes_cursor()
+
+
+async def poll_grid_score_changes(broker, window, executor):
+    """
+    Publish the grid score changes to the broker every window,
+    with one query for every client, from the cursor of the broker.
+    The database is queried in a thread, Django ORM is synchronous.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(window)
+        try:
+            until = await loop.run_in_executor(executor, current_cursor)
+            changes = await loop.run_in_executor(executor, grid_score_changes, broker.cursor, until)
+            broker.publish(changes, until)
+        except Exception:
+            logger.exception('Polling grid score changes failed')
+
+
+async def serve_grid_score_push(host='0.0.0.0', port=8001, window=1.0):
+    """
+    Run the server-sent events server, the broker and the changes poller until interrupted.
+    Clients resuming from an event ID, or from the cursor of /grid-score/changes/,
+    get the changes they missed from the database.
+    """
+    loop = asyncio.get_event_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def load_changes(since, until):
+        return await loop.run_in_executor(executor, grid_score_changes, since, until)
+
+    cursor = await loop.run_in_executor(executor, current_cursor)
+    broker = GridScoreBroker(window, load_changes, cursor)
+    server = await start_sse_server(broker, host, port)
+    print(f'Pushing grid score changes on http://{host}:{port}{EVENTS_PATH}')
+    try:
+        await asyncio.gather(broker.run(), poll_grid_score_changes(broker, window, executor))
+    finally:
+        server.close()
+        await server.wait_closed()
+        executor.shutdown(wait=False)
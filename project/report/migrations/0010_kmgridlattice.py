@@ -0,0 +1,49 @@
+# Generated by Django 3.0.3 on 2020-05-20 08:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0009_auto_20200516_1550'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KmGridLattice',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('srid', models.IntegerField(choices=[(4326, 'WGS84'), (3857, 'Web Mercator')], default=3857, help_text='Coordinate system in which the cells are equal')),
+                ('origin_x', models.FloatField(help_text='X coordinate of the top-left corner of the lattice')),
+                ('origin_y', models.FloatField(help_text='Y coordinate of the top-left corner of the lattice')),
+                ('cell_width', models.FloatField(help_text='Width of each cell')),
+                ('cell_height', models.FloatField(help_text='Height of each cell')),
+                ('rows', models.IntegerField(help_text='Number of rows in the lattice')),
+                ('columns', models.IntegerField(help_text='Number of columns in the lattice')),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.AddField(
+            model_name='kmgrid',
+            name='lattice',
+            field=models.ForeignKey(blank=True, default=None, help_text='Regular lattice this grid belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, to='report.KmGridLattice'),
+        ),
+        migrations.AddField(
+            model_name='kmgrid',
+            name='lattice_col',
+            field=models.IntegerField(blank=True, default=None, help_text='Column of this grid in the lattice', null=True),
+        ),
+        migrations.AddField(
+            model_name='kmgrid',
+            name='lattice_row',
+            field=models.IntegerField(blank=True, default=None, help_text='Row of this grid in the lattice', null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='kmgrid',
+            unique_together={('lattice', 'lattice_row', 'lattice_col')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.3 on 2020-05-21 03:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_grid_score_to_grid(apps, schema_editor):
+    """
+    Link every existing KmGridScore to the KmGrid with the same geometry.
+    """
+    KmGrid = apps.get_model('report', 'KmGrid')
+    KmGridScore = apps.get_model('report', 'KmGridScore')
+
+    grid_scores = KmGridScore.objects.filter(grid__isnull=True, geometry__isnull=False)
+    for grid_score_id, geometry in grid_scores.values_list('id', 'geometry').iterator():
+        grid_id = KmGrid.objects.filter(
+            geometry__equals=geometry,
+            grid_score__isnull=True
+        ).order_by('id').values_list('id', flat=True).first()
+        if grid_id is not None:
+            KmGridScore.objects.filter(id=grid_score_id).update(grid_id=grid_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0010_kmgridlattice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kmgridscore',
+            name='grid',
+            field=models.OneToOneField(blank=True, default=None, help_text='Grid of this score', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grid_score', to='report.KmGrid'),
+        ),
+        migrations.RunPython(link_grid_score_to_grid, migrations.RunPython.noop),
+    ]
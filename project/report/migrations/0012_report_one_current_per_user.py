@@ -0,0 +1,25 @@
+# Generated by Django 3.0.3 on 2020-05-22 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0011_kmgridscore_grid'),
+    ]
+
+    operations = [
+        # Keep only the latest current report of each user current
+        migrations.RunSQL(
+            'UPDATE report_report SET current = false '
+            'WHERE current AND id NOT IN ('
+            'SELECT MAX(id) FROM report_report WHERE current GROUP BY user_id'
+            ')',
+            migrations.RunSQL.noop
+        ),
+        migrations.AddConstraint(
+            model_name='report',
+            constraint=models.UniqueConstraint(condition=models.Q(current=True), fields=('user',), name='report_one_current_per_user'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.3 on 2020-05-23 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0012_report_one_current_per_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedReport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_id', models.IntegerField(help_text='ID reserved for the Report', unique=True)),
+                ('timestamp', models.DateTimeField(auto_now_add=True, help_text='Timestamp of report submission')),
+                ('grid', models.ForeignKey(blank=True, default=None, help_text='Grid reference of the report', null=True, on_delete=django.db.models.deletion.SET_NULL, to='report.KmGrid')),
+                ('status', models.ForeignKey(help_text='Status of this report', on_delete=django.db.models.deletion.CASCADE, to='report.Status')),
+                ('user', models.ForeignKey(help_text='Owner/user of this report', on_delete=django.db.models.deletion.CASCADE, to='report.User')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
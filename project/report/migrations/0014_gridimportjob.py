@@ -0,0 +1,34 @@
+# Generated by Django 3.0.3 on 2020-05-24 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0013_queuedreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GridImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(help_text='Uploaded GeoJSON file', upload_to='grid_imports/')),
+                ('size', models.BigIntegerField(default=0, help_text='Size of the file in bytes')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', help_text='Status of the import', max_length=10)),
+                ('bytes_read', models.BigIntegerField(default=0, help_text='Bytes of the file read so far')),
+                ('processed', models.IntegerField(default=0, help_text='Number of features processed')),
+                ('imported', models.IntegerField(default=0, help_text='Number of grids imported')),
+                ('errors', models.IntegerField(default=0, help_text='Number of features that could not be imported')),
+                ('message', models.TextField(blank=True, default='', help_text='Result or error message of the import')),
+                ('timestamp', models.DateTimeField(auto_now_add=True, help_text='Timestamp of upload')),
+                ('started_at', models.DateTimeField(blank=True, default=None, help_text='Timestamp of import start', null=True)),
+                ('updated_at', models.DateTimeField(blank=True, default=None, help_text='Timestamp of last progress update', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, default=None, help_text='Timestamp of import end', null=True)),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+    ]
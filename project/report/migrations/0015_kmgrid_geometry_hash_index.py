@@ -0,0 +1,18 @@
+# Generated by Django 3.0.3 on 2020-05-25 03:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0014_gridimportjob'),
+    ]
+
+    operations = [
+        # Used by import_grid --method upsert to match grids by geometry
+        migrations.RunSQL(
+            'CREATE INDEX report_kmgrid_geometry_hash ON report_kmgrid (md5(ST_AsEWKB(geometry)));',
+            'DROP INDEX IF EXISTS report_kmgrid_geometry_hash;'
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.3 on 2020-05-26 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0015_kmgrid_geometry_hash_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='status',
+            name='color',
+            field=models.SmallIntegerField(blank=True, choices=[(0, 'Green'), (1, 'Yellow'), (2, 'Red')], default=None, help_text='Color of the grid score counting reports with this status', null=True),
+        ),
+        # Same keywords as STATUS_COLOR_KEYWORDS
+        migrations.RunSQL(
+            "UPDATE report_status SET color = CASE "
+            "WHEN name ILIKE '%well%' THEN 0 "
+            "WHEN name ILIKE '%food%' OR name ILIKE '%supplies%' THEN 1 "
+            "WHEN name ILIKE '%medic%' THEN 2 "
+            "END",
+            migrations.RunSQL.noop
+        ),
+    ]
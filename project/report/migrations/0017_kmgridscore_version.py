@@ -0,0 +1,61 @@
+# Generated by Django 3.0.3 on 2020-05-27 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0016_status_color'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kmgridscore',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, help_text='ID of the transaction that last changed this grid score, set by a database trigger'),
+        ),
+        migrations.CreateModel(
+            name='KmGridScoreDeletion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grid_score_id', models.IntegerField(help_text='ID of the deleted grid score')),
+                ('version', models.BigIntegerField(db_index=True, help_text='ID of the transaction that deleted the grid score')),
+            ],
+            options={
+                'ordering': ('version',),
+            },
+        ),
+        # Every write of a grid score, also by update() and raw SQL, sets its version
+        migrations.RunSQL(
+            '''
+            CREATE FUNCTION report_kmgridscore_set_version() RETURNS trigger AS $$
+            BEGIN
+                NEW.version := txid_current();
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER report_kmgridscore_version
+            BEFORE INSERT OR UPDATE ON report_kmgridscore
+            FOR EACH ROW EXECUTE PROCEDURE report_kmgridscore_set_version();
+
+            CREATE FUNCTION report_kmgridscore_record_deletion() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO report_kmgridscoredeletion (grid_score_id, version) VALUES (OLD.id, txid_current());
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER report_kmgridscore_deletion
+            AFTER DELETE ON report_kmgridscore
+            FOR EACH ROW EXECUTE PROCEDURE report_kmgridscore_record_deletion();
+            ''',
+            '''
+            DROP TRIGGER IF EXISTS report_kmgridscore_deletion ON report_kmgridscore;
+            DROP FUNCTION IF EXISTS report_kmgridscore_record_deletion();
+            DROP TRIGGER IF EXISTS report_kmgridscore_version ON report_kmgridscore;
+            DROP FUNCTION IF EXISTS report_kmgridscore_set_version();
+            '''
+        ),
+    ]
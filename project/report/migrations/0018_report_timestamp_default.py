@@ -0,0 +1,19 @@
+# Generated by Django 3.0.3 on 2020-05-27 02:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0017_kmgridscore_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Timestamp of report creation'),
+        ),
+    ]
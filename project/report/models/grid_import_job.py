@@ -0,0 +1,147 @@
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GridImportJobManager(models.Manager):
+    """Custom Manager for GridImportJob."""
+
+    def start_next(self):
+        """
+        Mark the oldest queued job as running and return it, or None.
+        Jobs can be started by several workers at once.
+        """
+        with transaction.atomic():
+            job = self.get_queryset().select_for_update(skip_locked=True).filter(
+                status=GridImportJob.QUEUED
+            ).order_by('id').first()
+            if job is None:
+                return None
+            job.status = GridImportJob.RUNNING
+            job.started_at = timezone.now()
+            job.updated_at = job.started_at
+            job.save()
+        return job
+
+
+class GridImportJob(models.Model):
+    """
+    GeoJSON file uploaded in the admin page, imported to KmGrid in the background.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    file = models.FileField(
+        help_text=_('Uploaded GeoJSON file'),
+        upload_to='grid_imports/'
+    )
+
+    size = models.BigIntegerField(
+        help_text=_('Size of the file in bytes'),
+        default=0
+    )
+
+    status = models.CharField(
+        help_text=_('Status of the import'),
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED
+    )
+
+    bytes_read = models.BigIntegerField(
+        help_text=_('Bytes of the file read so far'),
+        default=0
+    )
+
+    processed = models.IntegerField(
+        help_text=_('Number of features processed'),
+        default=0
+    )
+
+    imported = models.IntegerField(
+        help_text=_('Number of grids imported'),
+        default=0
+    )
+
+    errors = models.IntegerField(
+        help_text=_('Number of features that could not be imported'),
+        default=0
+    )
+
+    message = models.TextField(
+        help_text=_('Result or error message of the import'),
+        blank=True,
+        default=''
+    )
+
+    timestamp = models.DateTimeField(
+        help_text=_('Timestamp of upload'),
+        auto_now_add=True
+    )
+
+    started_at = models.DateTimeField(
+        help_text=_('Timestamp of import start'),
+        null=True,
+        blank=True,
+        default=None
+    )
+
+    updated_at = models.DateTimeField(
+        help_text=_('Timestamp of last progress update'),
+        null=True,
+        blank=True,
+        default=None
+    )
+
+    finished_at = models.DateTimeField(
+        help_text=_('Timestamp of import end'),
+        null=True,
+        blank=True,
+        default=None
+    )
+
+    objects = GridImportJobManager()
+
+    def __str__(self):
+        return '{} | {} | {}'.format(self.id, self.file.name, self.status)
+
+    @property
+    def elapsed(self):
+        """
+        Seconds spent importing, up to the last progress update.
+        """
+        if self.started_at is None or self.updated_at is None:
+            return 0
+        return (self.updated_at - self.started_at).total_seconds()
+
+    @property
+    def rate(self):
+        """
+        Features processed per second.
+        """
+        if not self.elapsed:
+            return None
+        return self.processed / self.elapsed
+
+    @property
+    def eta(self):
+        """
+        Estimated seconds left, from the part of the file already read.
+        """
+        if self.status != self.RUNNING or not self.elapsed or not self.bytes_read:
+            return None
+        return max(self.size - self.bytes_read, 0) * self.elapsed / self.bytes_read
+
+    class Meta:
+        ordering = ('-id',)
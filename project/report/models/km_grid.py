@@ -1,11 +1,28 @@
+from django.conf import settings
 from django.contrib.gis.geos import fromstr
 from django.contrib.gis.db import models as gis
-from django.db import models
+from django.db import connection, models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
+from ..utils.grid_index import GridIndex, get_grid_index, invalidate_grid_index
+from ..utils.grid_lattice import detect_lattice
+from .km_grid_lattice import KmGridLattice
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Grid containing each point, highest ID first like KmGrid ordering
+GRID_IDS_CONTAIN_SQL = '''
+SELECT point.num, (
+    SELECT grid.id FROM {table} grid
+    WHERE ST_Contains(grid.geometry, ST_SetSRID(ST_MakePoint(point.x, point.y), 4326))
+    ORDER BY grid.id DESC
+    LIMIT 1
+)
+FROM unnest(%s::integer[], %s::double precision[], %s::double precision[]) AS point(num, x, y)
+'''
+
 class KmGridQuerySet(models.QuerySet):
     """Custom version manager for Grid."""
 
@@ -21,6 +38,73 @@ class KmGridQuerySet(models.QuerySet):
             geometry__equals=geometry
         )
 
+    def grid_id_contains(self, geojson_geometry_string):
+        """
+        Return ID of the grid containing the geometry, or None.
+        The process-local GridIndex is checked first, then the database,
+        in case the grid was imported after the index was built.
+        """
+        geometry = fromstr(geojson_geometry_string, srid=4326)
+        grid_id = None
+        if geometry.geom_type == 'Point':
+            index = get_grid_index(build_grid_index, settings.GRID_INDEX_TTL)
+            grid_id = index.locate(geometry.x, geometry.y)
+        if grid_id is None:
+            grid_id = self.filter(
+                geometry__contains=geometry
+            ).values_list('id', flat=True).first()
+        return grid_id
+
+    def grid_ids_contain(self, coordinates):
+        """
+        Return ID of the grid containing each coordinate, or None.
+        Coordinates missed by the GridIndex are resolved together
+        with a single spatial query.
+        :param coordinates: list of (longitude, latitude)
+        :return: list of grid ID, in the same order
+        """
+        if not coordinates:
+            return []
+        index = get_grid_index(build_grid_index, settings.GRID_INDEX_TTL)
+        grid_ids = [index.locate(x, y) for x, y in coordinates]
+
+        missing = [num for num, grid_id in enumerate(grid_ids) if grid_id is None]
+        if missing:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    GRID_IDS_CONTAIN_SQL.format(table=connection.ops.quote_name(self.model._meta.db_table)),
+                    [
+                        missing,
+                        [float(coordinates[num][0]) for num in missing],
+                        [float(coordinates[num][1]) for num in missing],
+                    ]
+                )
+                for num, grid_id in cursor.fetchall():
+                    grid_ids[num] = grid_id
+        return grid_ids
+
+    def assign_lattice(self):
+        """
+        Detect a regular lattice among grids not yet in a lattice,
+        and record the row and column of each grid fitting it.
+        """
+        grids = self.filter(lattice__isnull=True)
+        lattice, cells = detect_lattice(grids.values_list('id', 'geometry').iterator())
+        if lattice is None:
+            return None
+
+        km_grid_lattice = KmGridLattice.objects.create(**lattice.as_dict())
+        self.model.objects.bulk_update(
+            [
+                self.model(id=grid_id, lattice=km_grid_lattice, lattice_row=row, lattice_col=column)
+                for grid_id, (row, column) in cells.items()
+            ],
+            ['lattice', 'lattice_row', 'lattice_col'],
+            batch_size=1000
+        )
+        invalidate_grid_index()
+        return km_grid_lattice
+
 
 class KmGrid(models.Model):
     """
@@ -41,6 +125,29 @@ class KmGrid(models.Model):
         default=300
     )
 
+    lattice = models.ForeignKey(
+        KmGridLattice,
+        help_text=_('Regular lattice this grid belongs to'),
+        null=True,
+        blank=True,
+        default=None,
+        on_delete=models.SET_NULL
+    )
+
+    lattice_row = models.IntegerField(
+        help_text=_('Row of this grid in the lattice'),
+        null=True,
+        blank=True,
+        default=None
+    )
+
+    lattice_col = models.IntegerField(
+        help_text=_('Column of this grid in the lattice'),
+        null=True,
+        blank=True,
+        default=None
+    )
+
     objects = KmGridQuerySet().as_manager()
 
     def __str__(self):
@@ -49,3 +156,29 @@ class KmGrid(models.Model):
     class Meta:
         managed = True
         ordering = ('-id',)
+        unique_together = ('lattice', 'lattice_row', 'lattice_col')
+
+
+def build_grid_index():
+    """
+    Build GridIndex from all grids.
+    Grids in a lattice are loaded without their geometry.
+    """
+    lattices = {
+        km_grid_lattice.id: km_grid_lattice.as_lattice()
+        for km_grid_lattice in KmGridLattice.objects.all()
+    }
+    cells = KmGrid.objects.filter(lattice__isnull=False).values_list(
+        'lattice_id', 'lattice_row', 'lattice_col', 'id'
+    ).iterator()
+    grids = KmGrid.objects.filter(lattice__isnull=True).values_list('id', 'geometry').iterator()
+    return GridIndex(grids, lattices, cells)
+
+
+@receiver(post_save, sender=KmGrid)
+@receiver(post_delete, sender=KmGrid)
+def km_grid_changed_signal(sender, instance, **kwargs):
+    """
+    Rebuild the GridIndex on next lookup after a grid is changed
+    """
+    invalidate_grid_index()
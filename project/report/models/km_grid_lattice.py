@@ -0,0 +1,64 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+from ..utils.grid_lattice import Lattice, WGS84, WEB_MERCATOR
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class KmGridLattice(models.Model):
+    """
+    Regular lattice of equal, axis-aligned KmGrid cells detected on import.
+    Grid of a coordinate inside the lattice is addressed by its row and column.
+    """
+    SRID_CHOICES = (
+        (WGS84, 'WGS84'),
+        (WEB_MERCATOR, 'Web Mercator'),
+    )
+
+    srid = models.IntegerField(
+        help_text=_('Coordinate system in which the cells are equal'),
+        choices=SRID_CHOICES,
+        default=WEB_MERCATOR
+    )
+
+    origin_x = models.FloatField(
+        help_text=_('X coordinate of the top-left corner of the lattice')
+    )
+
+    origin_y = models.FloatField(
+        help_text=_('Y coordinate of the top-left corner of the lattice')
+    )
+
+    cell_width = models.FloatField(
+        help_text=_('Width of each cell')
+    )
+
+    cell_height = models.FloatField(
+        help_text=_('Height of each cell')
+    )
+
+    rows = models.IntegerField(
+        help_text=_('Number of rows in the lattice')
+    )
+
+    columns = models.IntegerField(
+        help_text=_('Number of columns in the lattice')
+    )
+
+    def __str__(self):
+        return '{} | {} | {}x{}'.format(self.id, self.srid, self.rows, self.columns)
+
+    def as_lattice(self):
+        return Lattice(
+            self.srid,
+            self.origin_x,
+            self.origin_y,
+            self.cell_width,
+            self.cell_height,
+            self.rows,
+            self.columns
+        )
+
+    class Meta:
+        ordering = ('-id',)
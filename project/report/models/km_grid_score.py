@@ -1,12 +1,65 @@
 from django.contrib.gis.geos import fromstr
 from django.contrib.gis.db import models as gis
-from django.db import models
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
 from django.utils.translation import ugettext_lazy as _
-from ..utils.scoring_grid import color_score_km_grid, status_score_km_grid
+from ..utils.scoring_grid import color_score_km_grid, round_score, status_score_km_grid
+from ..utils.scoring_sql import ColorScore, StatusScore
+from ..utils.geometry_output import BBOX, GeometryOutput
+from ..utils.grid_score_cache import invalidate_grid_score_cache, invalidate_grid_score_extents
+from ..utils.tiles import tile_bounds
+from .km_grid import KmGrid
+from .status import COLOR_NAMES
 import logging
 
 logger = logging.getLogger(__name__)
 
+COLORS = ('green', 'yellow', 'red')
+
+MVT_LAYER = 'grid_score'
+
+# Grid scores inside the tile envelope (in Web Mercator) as a Mapbox Vector Tile.
+# The envelope is transformed to WGS84 to use the geometry index.
+MVT_TILE_SQL = '''
+WITH bounds AS (
+    SELECT ST_MakeEnvelope(%s, %s, %s, %s, 3857) AS geom
+)
+SELECT ST_AsMVT(tile, %s, %s, 'geom') FROM (
+    SELECT
+        grid_score.id,
+        grid_score.total_score::integer AS total_score,
+        grid_score.total_report,
+        grid_score.count_green,
+        grid_score.count_yellow,
+        grid_score.count_red,
+        ST_AsMVTGeom(ST_Transform(grid_score.geometry, 3857), bounds.geom, %s, %s, true) AS geom
+    FROM {table} grid_score, bounds
+    WHERE grid_score.geometry && ST_Transform(bounds.geom, 4326)
+) tile
+WHERE tile.geom IS NOT NULL
+'''
+
+# GeoJSON Feature of a grid score, in the shape of KmGridScoreSerializer, built by PostgreSQL
+# Geometry and bbox are JSON text expressions from GeometryOutput.
+GEOJSON_FEATURE_SQL = '''
+json_build_object(
+    'id', {table}.id,
+    'type', 'Feature',
+    'geometry', ({geometry})::json,{bbox}
+    'properties', json_build_object('total_score', {table}.total_score::text)
+)::text
+'''
+
+
+def color_by_status(status):
+    """
+    Color of the grid score counting the status, or None.
+    """
+    return COLOR_NAMES.get(status.color)
+
+
 class KmGridScoreQuerySet(models.QuerySet):
     """Custom version manager for Grid."""
 
@@ -34,6 +87,128 @@ class KmGridScoreQuerySet(models.QuerySet):
     def grid_with_report(self):
         return self.filter(total_report__gt=0)
 
+    def apply_report_delta(self, green=0, yellow=0, red=0, total_report=0):
+        """
+        Add to the report counts and recalculate the color scores and total score
+        in a single UPDATE, computed from the row values in the database.
+        Concurrent reports on the same grid cannot overwrite each other.
+
+        ::params::
+        green, yellow, red : number of report to add to each color count, can be negative
+        total_report : number of report to add to total_report
+
+        ::return :: number of updated grid scores
+        ::return type :: integer
+        """
+        delta = {'green': green, 'yellow': yellow, 'red': red}
+        counts = {color: F(f'count_{color}') + delta[color] for color in COLORS}
+
+        fields = {'total_report': F('total_report') + total_report}
+        for color in COLORS:
+            fields[f'count_{color}'] = counts[color]
+            fields[f'score_{color}'] = ColorScore(counts[color], F('population'), color)
+        fields['total_score'] = StatusScore(
+            counts['green'],
+            counts['yellow'],
+            counts['red'],
+            F('population'),
+        )
+        return self.update(**fields)
+
+    def geojson_features(self, geometry_output=None):
+        """
+        GeoJSON Feature of each grid score, serialized by PostgreSQL
+        without creating a model instance per grid score.
+
+        ::params::
+        geometry_output : GeometryOutput, polygons with 6 decimal digits by default
+
+        ::return :: features encoded as JSON, same as KmGridScoreSerializer
+        ::return type :: QuerySet of string
+        """
+        if geometry_output is None:
+            geometry_output = GeometryOutput()
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        column = f'{table}.geometry'
+        geometry_sql, params = geometry_output.geometry_sql(column)
+        bbox = ''
+        if geometry_output.shape == BBOX:
+            bbox_sql, bbox_params = geometry_output.bbox_sql(column)
+            bbox = f"\n    'bbox', ({bbox_sql})::json,"
+            params = params + bbox_params
+
+        feature = RawSQL(
+            GEOJSON_FEATURE_SQL.format(table=table, geometry=geometry_sql, bbox=bbox),
+            params,
+            output_field=models.TextField()
+        )
+        return self.annotate(feature=feature).values_list('feature', flat=True)
+
+    def changed_since(self, since, until):
+        """
+        Grid scores changed by the transactions from `since` up to `until` excluded, see changes_cursor.
+        """
+        return self.filter(version__gte=since, version__lt=until)
+
+    def rescore_population(self):
+        """
+        Copy population from the grid, then recalculate the color scores
+        and total score from the counts, without touching the reports.
+
+        ::return :: number of updated grid scores
+        ::return type :: integer
+        """
+        self.update(population=Subquery(
+            KmGrid.objects.filter(id=OuterRef('grid_id')).values('population')[:1]
+        ))
+        return self.apply_report_delta()
+
+
+def mvt_tile(z, x, y, extent=4096, buffer=64):
+    """
+    Render grid scores of a XYZ tile as Mapbox Vector Tile, with ST_AsMVT.
+    Features have id, total_score, total_report and the count of each color.
+
+    ::return :: tile, empty if there is no grid score in it
+    ::return type :: bytes
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            MVT_TILE_SQL.format(table=connection.ops.quote_name(KmGridScore._meta.db_table)),
+            list(tile_bounds(z, x, y)) + [MVT_LAYER, extent, extent, buffer]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return b''
+    return bytes(row[0])
+
+
+def invalidate_grid_score_cache_of_grids(grid_ids):
+    """
+    Invalidate cached tiles and responses showing the grid scores of the grids.
+    """
+    grid_ids = list(grid_ids)
+    if len(grid_ids) > settings.GRID_SCORE_CACHE_MAX_EXTENTS:
+        invalidate_grid_score_cache()
+        return
+    invalidate_grid_score_extents(
+        geometry.extent
+        for geometry in KmGrid.objects.filter(id__in=grid_ids).values_list('geometry', flat=True)
+    )
+
+
+def changes_cursor():
+    """
+    Upper bound of the grid score versions whose transaction has ended.
+    Versions are transaction IDs, so changes below it are all committed
+    or rolled back, and no change can appear below it afterwards.
+
+    ::return type :: integer
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+
 
 class KmGridScoreManager(models.Manager):
     """Custom version manager for Grid Score."""
@@ -70,6 +245,16 @@ class KmGridScore(models.Model):
     """
     Materialized uiews for user status summary per grid
     """
+    grid = models.OneToOneField(
+        KmGrid,
+        help_text=_('Grid of this score'),
+        related_name='grid_score',
+        null=True,
+        blank=True,
+        default=None,
+        on_delete=models.CASCADE
+    )
+
     geometry = gis.PolygonField(
         help_text=_('Geometry of this Grid'),
         null=True,
@@ -148,41 +333,36 @@ class KmGridScore(models.Model):
         default=0
     )
 
+    version = models.BigIntegerField(
+        help_text=_('ID of the transaction that last changed this grid score, set by a database trigger'),
+        default=0,
+        editable=False,
+        db_index=True
+    )
+
     objects = KmGridScoreManager()
 
     def __str__(self):
         return '{} | {} | {} | {}'.format(self.id, self.geometry, self.population, self.total_score)
 
     def set_color_score(self, color="green"):
-        score = color_score_km_grid(getattr(self, f'count_{color}'), self.population, color)
+        score = round_score(color_score_km_grid(getattr(self, f'count_{color}'), self.population, color))
         setattr(self, f'score_{color}', score)
         self.save()
 
     def set_color_score_by_status(self, status):
-        if "well" in status.name:
-            self.set_color_score('green')
-        elif "supplies" in status.name:
-            self.set_color_score('yellow')
-        elif "medical" in status.name:
-            self.set_color_score('red')
+        color = color_by_status(status)
+        if color is not None:
+            self.set_color_score(color)
 
     def set_color_count_by_status(self, status, operation='add'):
-
-        if "well" in status.name:
-            if operation == 'add':
-                self.count_green += 1
-            if operation == 'sub':
-                self.count_green -= 1
-        elif "supplies" in status.name:
-            if operation == 'add':
-                self.count_yellow += 1
-            if operation == 'sub':
-                self.count_yellow -= 1
-        elif "medical" in status.name:
+        color = color_by_status(status)
+        if color is not None:
+            count = getattr(self, f'count_{color}')
             if operation == 'add':
-                self.count_red += 1
+                setattr(self, f'count_{color}', count + 1)
             if operation == 'sub':
-                self.count_red -= 1
+                setattr(self, f'count_{color}', count - 1)
         self.save()
 
     def set_total_score(self):
@@ -0,0 +1,26 @@
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class KmGridScoreDeletion(models.Model):
+    """
+    Deleted KmGridScore, written by a database trigger,
+    so the changes feed can tell clients to remove it.
+    """
+    grid_score_id = models.IntegerField(
+        help_text=_('ID of the deleted grid score')
+    )
+
+    version = models.BigIntegerField(
+        help_text=_('ID of the transaction that deleted the grid score'),
+        db_index=True
+    )
+
+    def __str__(self):
+        return '{} | {}'.format(self.grid_score_id, self.version)
+
+    class Meta:
+        ordering = ('version',)
@@ -0,0 +1,104 @@
+from django.db import connection, models, transaction
+from django.utils.translation import ugettext_lazy as _
+from .km_grid import KmGrid
+from .report import Report, bulk_create_reports
+from .status import Status
+from .user import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock held by the worker applying queued reports
+APPLY_LOCK_KEY = 7315001
+
+
+class QueuedReportManager(models.Manager):
+    """Custom Manager for QueuedReport."""
+
+    def enqueue(self, grid=None, status=None, user=None):
+        """
+        Queue a report, reserving the ID it will have once applied.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id'))",
+                [Report._meta.db_table]
+            )
+            report_id = cursor.fetchone()[0]
+        return self.create(report_id=report_id, grid=grid, status=status, user=user)
+
+    def apply_batch(self, batch_size=1000):
+        """
+        Apply the oldest queued reports as Report, in one transaction.
+        Only one worker applies batches at a time, so the reports of a user are
+        applied in order, and their grid score deltas come from the right
+        previous status. Other workers get 0 while the lock is taken.
+        :return: number of applied reports
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [APPLY_LOCK_KEY])
+                if not cursor.fetchone()[0]:
+                    return 0
+            queued_reports = list(self.get_queryset().order_by('id')[:batch_size])
+            if not queued_reports:
+                return 0
+
+            bulk_create_reports([
+                Report(
+                    id=queued_report.report_id,
+                    grid_id=queued_report.grid_id,
+                    status_id=queued_report.status_id,
+                    user_id=queued_report.user_id,
+                    timestamp=queued_report.timestamp
+                )
+                for queued_report in queued_reports
+            ])
+            self.get_queryset().filter(
+                id__in=[queued_report.id for queued_report in queued_reports]
+            ).delete()
+        return len(queued_reports)
+
+
+class QueuedReport(models.Model):
+    """
+    Report accepted by the API and waiting to be applied by the report queue worker.
+    """
+    report_id = models.IntegerField(
+        help_text=_('ID reserved for the Report'),
+        unique=True
+    )
+
+    grid = models.ForeignKey(
+        KmGrid,
+        help_text=_('Grid reference of the report'),
+        null=True,
+        default=None,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+
+    status = models.ForeignKey(
+        Status,
+        help_text=_('Status of this report'),
+        on_delete=models.CASCADE
+    )
+
+    user = models.ForeignKey(
+        User,
+        help_text=_('Owner/user of this report'),
+        on_delete=models.CASCADE
+    )
+
+    timestamp = models.DateTimeField(
+        help_text=_('Timestamp of report submission'),
+        auto_now_add=True
+    )
+
+    objects = QueuedReportManager()
+
+    def __str__(self):
+        return '{} | {} | {}'.format(self.id, self.report_id, self.timestamp)
+
+    class Meta:
+        ordering = ('id',)
@@ -1,12 +1,14 @@
 from django.contrib.gis.geos import fromstr
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from .user import User
 from .km_grid import KmGrid
-from .km_grid_score import KmGridScore
-from .status import Status
+from .km_grid_score import KmGridScore, invalidate_grid_score_cache_of_grids
+from .status import Status, status_color, status_ids_with_color
+from ..utils.grid_score_cache import invalidate_grid_score_extents
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,14 +28,20 @@ class ReportQuerySet(models.QuerySet):
             status__name__icontains=status_name
         )
 
+    def status_color(self, color):
+        """
+        Reports whose status has the color, compared on status ID without joining Status.
+        """
+        return self.filter(status_id__in=status_ids_with_color(color))
+
     def green_report(self):
-        return self.status_contains('well')
+        return self.status_color('green')
 
     def yellow_report(self):
-        return self.status_contains('food')
+        return self.status_color('yellow')
 
     def red_report(self):
-        return self.status_contains('medic')
+        return self.status_color('red')
 
 
 class ReportManager(models.Manager):
@@ -49,13 +57,13 @@ class ReportManager(models.Manager):
         )
 
     def green_report(self):
-        return self.get_queryset().status_contains('well')
+        return self.get_queryset().green_report()
 
     def yellow_report(self):
-        return self.get_queryset().status_contains('food')
+        return self.get_queryset().yellow_report()
 
     def red_report(self):
-        return self.get_queryset().status_contains('medic')
+        return self.get_queryset().red_report()
 
 
 class CurrentReportManager(ReportManager):
@@ -91,7 +99,7 @@ class Report(models.Model):
 
     timestamp = models.DateTimeField(
         help_text=_('Timestamp of report creation'),
-        auto_now_add=True
+        default=timezone.now
     )
 
     user = models.ForeignKey(
@@ -110,6 +118,11 @@ class Report(models.Model):
     objects = models.Manager()
     current_objects = ReportManager()
 
+    def save(self, *args, **kwargs):
+        # The previous current report is updated in the same transaction, see report_pre_save_signal
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         if self.grid:
             return '{} | {} | {} | {}'.format(self.id, self.grid.id, self.timestamp, self.user.id)
@@ -118,14 +131,38 @@ class Report(models.Model):
 
     class Meta:
         ordering = ('-id',)
+        constraints = [
+            # At most one current report per user, also used to find it
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(current=True),
+                name='report_one_current_per_user'
+            ),
+        ]
+
+
+def lock_report_users(user_ids):
+    """
+    Lock the users until the end of the transaction, so concurrent reports
+    of a user, e.g. a double-tapped submit, are created one after the other.
+    Otherwise both would unset the same previous current report, and the
+    second insert would fail the report_one_current_per_user index.
+    """
+    list(User.objects.select_for_update().filter(id__in=user_ids).order_by('id').values_list('id', flat=True))
 
 
 @receiver(pre_save, sender=Report)
 def report_pre_save_signal(sender, instance, **kwargs):
     """
-    Set False to previous status `current` field
+    Set False to previous status `current` field.
+    Only the previous current report is updated, at most one row.
     """
-    Report.objects.filter(user=instance.user).update(current=False)
+    if instance.current:
+        lock_report_users([instance.user_id])
+        Report.objects.filter(
+            user=instance.user,
+            current=True
+        ).exclude(id=instance.id).update(current=False)
 
 @receiver(post_save, sender=Report)
 def report_post_save_signal(sender, instance, created, **kwargs):
@@ -133,39 +170,130 @@ def report_post_save_signal(sender, instance, created, **kwargs):
     This is the post save signal for post creation.
     KmGridScore assuming current report's grid
     is just the same with previous one. It's quarantine afterall.
+    The grid score is updated with a single atomic UPDATE.
     :param instance: Report instance
     """
 
-    # Only do when grid is not None
-    if instance.grid is not None:
-        grid_score, created = KmGridScore.objects.get_or_create(geometry=instance.grid.geometry)
+    # Only do when report is created and grid is not None
+    if not created or instance.grid is None:
+        return
 
-        # if grid is just created, then set its attribute
-        if created:
-            grid_score.population = instance.grid.population
-            grid_score.total_report += 1
-            grid_score.set_color_score_by_status(instance.status)
-            grid_score.set_color_count_by_status(instance.status)
-        else:
-            # if grid exists, check if the instance is the first report created by
-            # the user in that grid
-            user_report = Report.objects.filter(user=instance.user, grid=instance.grid)
-
-            # If yes, update grid attributes
-            if user_report.count() == 1:
-                grid_score.total_report += 1
-                grid_score.set_color_score_by_status(instance.status)
-                grid_score.set_color_count_by_status(instance.status)
-
-            # If no, check if current report has the same status as the previous one
-            else:
-                prev_report = user_report[1]
-
-                # If yes, we decrement the old status count in the grid and recalculate that status score
-                # Then increment the newstatus count in the grid and recalculate that status score
-                if not instance.status == prev_report.status:
-                    grid_score.set_color_score_by_status(prev_report.status)
-                    grid_score.set_color_count_by_status(prev_report.status, 'sub')
-
-                    grid_score.set_color_score_by_status(instance.status)
-                    grid_score.set_color_count_by_status(instance.status)
+    grid_score, grid_score_created = KmGridScore.objects.get_or_create(
+        grid=instance.grid,
+        defaults={
+            'geometry': instance.grid.geometry,
+            'population': instance.grid.population
+        }
+    )
+    delta = {'green': 0, 'yellow': 0, 'red': 0, 'total_report': 0}
+    color = status_color(instance.status_id)
+
+    # Latest two reports created by the user in that grid
+    user_report_status = list(
+        Report.objects.filter(user=instance.user, grid=instance.grid).values_list('status_id', flat=True)[:2]
+    )
+
+    # If grid score is just created or it is the first report created by the user
+    # in that grid, count the report
+    if grid_score_created or len(user_report_status) == 1:
+        delta['total_report'] += 1
+        if color is not None:
+            delta[color] += 1
+
+    # If no, check if current report has the same status as the previous one.
+    # If not, we decrement the old status count and increment the new status count
+    elif instance.status_id != user_report_status[1]:
+        prev_color = status_color(user_report_status[1])
+        if prev_color is not None:
+            delta[prev_color] -= 1
+        if color is not None:
+            delta[color] += 1
+
+    if any(delta.values()):
+        KmGridScore.objects.filter(id=grid_score.id).apply_report_delta(**delta)
+        extent = instance.grid.geometry.extent
+        transaction.on_commit(lambda: invalidate_grid_score_extents([extent]))
+
+
+@transaction.atomic
+def bulk_create_reports(reports):
+    """
+    Create many reports at once, with the same effect on `current` flags and
+    KmGridScore as creating them one by one through the signals:
+    one UPDATE of previous current reports, one bulk INSERT,
+    and one aggregated grid score UPDATE per grid.
+    Previous reports are read once their users are locked.
+    :param reports: unsaved Report instances, in order of creation
+    :return: created Report instances
+    """
+    reports = list(reports)
+    if not reports:
+        return reports
+
+    # Only the latest report of each user in the batch is current
+    latest_report = {}
+    for report in reports:
+        latest_report[report.user_id] = report
+    for report in reports:
+        report.current = latest_report[report.user_id] is report
+
+    lock_report_users(latest_report.keys())
+
+    # Latest status of each user in each grid before this batch
+    grid_ids = {report.grid_id for report in reports if report.grid_id is not None}
+    user_grid_status = {}
+    if grid_ids:
+        previous_reports = Report.objects.filter(
+            user_id__in=latest_report.keys(),
+            grid_id__in=grid_ids
+        ).order_by('user_id', 'grid_id', '-id').distinct('user_id', 'grid_id')
+        for user_id, grid_id, status_id in previous_reports.values_list('user_id', 'grid_id', 'status_id'):
+            user_grid_status[(user_id, grid_id)] = status_id
+
+    status_ids = {report.status_id for report in reports} | set(user_grid_status.values())
+    status_colors = {status_id: status_color(status_id) for status_id in status_ids}
+    scored_grid_ids = set(
+        KmGridScore.objects.filter(grid_id__in=grid_ids).values_list('grid_id', flat=True)
+    )
+    new_grid_ids = grid_ids - scored_grid_ids
+
+    # Same rules as report_post_save_signal, summed per grid
+    deltas = {}
+    for report in reports:
+        if report.grid_id is None:
+            continue
+        delta = deltas.setdefault(report.grid_id, {'green': 0, 'yellow': 0, 'red': 0, 'total_report': 0})
+        color = status_colors.get(report.status_id)
+        previous_status_id = user_grid_status.get((report.user_id, report.grid_id))
+
+        if report.grid_id not in scored_grid_ids or previous_status_id is None:
+            delta['total_report'] += 1
+            if color is not None:
+                delta[color] += 1
+        elif previous_status_id != report.status_id:
+            previous_color = status_colors.get(previous_status_id)
+            if previous_color is not None:
+                delta[previous_color] -= 1
+            if color is not None:
+                delta[color] += 1
+
+        scored_grid_ids.add(report.grid_id)
+        user_grid_status[(report.user_id, report.grid_id)] = report.status_id
+
+    Report.objects.filter(user_id__in=latest_report.keys(), current=True).update(current=False)
+    Report.objects.bulk_create(reports)
+
+    # Another request may have created some of these grid scores meanwhile
+    KmGridScore.objects.bulk_create([
+        KmGridScore(grid_id=grid_id, geometry=geometry, population=population)
+        for grid_id, geometry, population in KmGrid.objects.filter(
+            id__in=new_grid_ids
+        ).values_list('id', 'geometry', 'population')
+    ], ignore_conflicts=True)
+    changed_grid_ids = [grid_id for grid_id, delta in deltas.items() if any(delta.values())]
+    for grid_id in changed_grid_ids:
+        KmGridScore.objects.filter(grid_id=grid_id).apply_report_delta(**deltas[grid_id])
+
+    if changed_grid_ids:
+        transaction.on_commit(lambda: invalidate_grid_score_cache_of_grids(changed_grid_ids))
+    return reports
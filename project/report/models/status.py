@@ -1,9 +1,101 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
+from ..utils.status_cache import invalidate_status_responses
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Color of the reports with a status, same values as KmGridScore total_score
+GREEN = 0
+YELLOW = 1
+RED = 2
+COLOR_CHOICES = (
+    (GREEN, 'Green'),
+    (YELLOW, 'Yellow'),
+    (RED, 'Red'),
+)
+COLOR_NAMES = {
+    GREEN: 'green',
+    YELLOW: 'yellow',
+    RED: 'red',
+}
+
+# Keywords of the status name giving the color of a new status without color
+STATUS_COLOR_KEYWORDS = {
+    GREEN: ('well',),
+    YELLOW: ('food', 'supplies'),
+    RED: ('medic',),
+}
+
+_status_colors = None
+_status_colors_loaded_at = 0
+_status_colors_lock = threading.Lock()
+
+def color_from_name(name):
+    """
+    Color of a status from the keywords in its name, or None.
+    """
+    name = (name or '').lower()
+    for color, keywords in STATUS_COLOR_KEYWORDS.items():
+        if any(keyword in name for keyword in keywords):
+            return color
+    return None
+
+
+def status_colors():
+    """
+    Return the process-local {status ID: color name or None}, loading it when needed.
+    It is reloaded after STATUS_CACHE_TTL seconds, to see statuses saved by another process.
+
+    ::return type :: dict
+    """
+    global _status_colors, _status_colors_loaded_at
+
+    with _status_colors_lock:
+        expired = time.monotonic() - _status_colors_loaded_at > settings.STATUS_CACHE_TTL
+        if _status_colors is None or expired:
+            _status_colors = {
+                status_id: COLOR_NAMES.get(color)
+                for status_id, color in Status.objects.values_list('id', 'color')
+            }
+            _status_colors_loaded_at = time.monotonic()
+        return _status_colors
+
+
+def status_color(status_id):
+    """
+    Color name of the status, or None.
+    """
+    colors = status_colors()
+    if status_id is not None and status_id not in colors:
+        # Saved by another process since the statuses were loaded
+        invalidate_status_cache()
+        colors = status_colors()
+    return colors.get(status_id)
+
+
+def status_ids_with_color(color):
+    """
+    ID of the statuses of a color name.
+    """
+    return [status_id for status_id, status_color in status_colors().items() if status_color == color]
+
+
+def invalidate_status_cache():
+    """
+    Drop the process-local status colors and responses so the next lookup reloads them.
+    """
+    global _status_colors
+
+    with _status_colors_lock:
+        _status_colors = None
+    invalidate_status_responses()
+
 
 class Status(models.Model):
     """
@@ -24,9 +116,35 @@ class Status(models.Model):
         default=None
     )
 
+    color = models.SmallIntegerField(
+        help_text=_('Color of the grid score counting reports with this status'),
+        choices=COLOR_CHOICES,
+        null=True,
+        blank=True,
+        default=None
+    )
+
     def __str__(self):
         return '{} | {}'.format(self.id, self.name)
 
     class Meta:
         ordering = ('name',)
         verbose_name_plural = 'Statuses'
+
+
+@receiver(pre_save, sender=Status)
+def status_pre_save_signal(sender, instance, **kwargs):
+    """
+    Give a new status without color the color of its name keywords.
+    """
+    if instance._state.adding and instance.color is None:
+        instance.color = color_from_name(instance.name)
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_delete, sender=Status)
+def status_invalidate_cache_signal(sender, **kwargs):
+    """
+    Reload status colors after a status is saved or deleted.
+    """
+    invalidate_status_cache()
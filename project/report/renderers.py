@@ -0,0 +1,16 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class MVTRenderer(BaseRenderer):
+    """
+    Renders Mapbox Vector Tile bytes as they are.
+    """
+    media_type = 'application/vnd.mapbox-vector-tile'
+    format = 'mvt'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, (bytes, memoryview)):
+            return b''
+        return bytes(data)
@@ -5,6 +5,7 @@ from .models.report import Report
 from .models.km_grid import KmGrid
 from .models.km_grid_score import KmGridScore
 from .models.user import User
+import json
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -47,6 +48,8 @@ class ReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Report
         fields = '__all__'
+        # Set when the report is submitted, not by the client
+        read_only_fields = ('timestamp',)
 
 
 class ReportRetrieveListSerializer(serializers.ModelSerializer):
@@ -62,7 +65,35 @@ class ReportRetrieveListSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class KmGridSerializer(GeoFeatureModelSerializer):
+class OutputGeometryField(GeometryField):
+    """
+    Geometry read from the `output_geometry` GeoJSON annotation when the queryset
+    has one, see GeometryOutput.annotate.
+    """
+
+    def get_attribute(self, instance):
+        if hasattr(instance, 'output_geometry'):
+            return json.loads(instance.output_geometry) if instance.output_geometry else None
+        return super().get_attribute(instance)
+
+
+class GeometryOutputSerializer(GeoFeatureModelSerializer):
+    """
+    GeoJSON Feature serializer writing the geometry, and the bbox,
+    computed by GeometryOutput when the queryset is annotated.
+    """
+    geometry = OutputGeometryField()
+
+    def to_representation(self, instance):
+        feature = super().to_representation(instance)
+        output_bbox = getattr(instance, 'output_bbox', None)
+        if output_bbox:
+            feature['bbox'] = json.loads(output_bbox)
+            feature.move_to_end('properties')
+        return feature
+
+
+class KmGridSerializer(GeometryOutputSerializer):
     """
     Serializer for KmGrid object.
     """
@@ -73,7 +104,7 @@ class KmGridSerializer(GeoFeatureModelSerializer):
         fields = '__all__'
 
 
-class KmGridScoreSerializer(GeoFeatureModelSerializer):
+class KmGridScoreSerializer(GeometryOutputSerializer):
     """
     Serializer for KmGridScore object.
     """
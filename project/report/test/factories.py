@@ -49,10 +49,11 @@ class KmGridFactory(factory.django.DjangoModelFactory):
 class KmGridScoreFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = 'report.KmGridScore'
-        django_get_or_create = ('geometry',)
+        django_get_or_create = ('grid',)
 
     id = factory.Sequence(lambda n: n)
-    geometry = factory.Sequence(get_grid_from_file)
+    grid = factory.SubFactory(KmGridFactory)
+    geometry = factory.LazyAttribute(lambda o: o.grid.geometry)
     population = factory.LazyAttribute(lambda o: random.randrange(1, 100))
     count_green = factory.LazyAttribute(lambda o: random.randrange(1, o.population))
     score_green = factory.LazyAttribute(lambda o: color_score_km_grid(o.count_green, o.population, 'green'))
@@ -1,19 +1,30 @@
 from contextlib import redirect_stdout
 from django.conf import settings
+from django.test import override_settings
 from nose.tools import eq_
 from rest_framework.test import APITestCase
 from rest_framework import status as http_status
 from faker import Faker
 from project.report.models.km_grid import KmGrid
+from project.report.models.km_grid_lattice import KmGridLattice
 from project.users.test.factories import UserAdminFactory
 from project.report.management.commands.import_grid import read_local_file, check_json_loadable, \
-    check_geojson_loadable, check_path_exist_and_is_file, import_grid_from_geojson
-from project.report.management.commands.generate_grid_score import generate_grid_score
+    check_geojson_loadable, check_path_exist_and_is_file, import_grid_from_geojson, import_grid_from_file
+from project.report.management.commands.generate_grid_score import generate_grid_score, \
+    generate_grid_score_bulk
+from project.report.models.km_grid_score import KmGridScore
+from project.report.models.grid_import_job import GridImportJob
+from project.report.management.commands.process_grid_import import process_grid_import_jobs
+from project.report.utils.scoring_grid import color_score_km_grid
+from .factories import ReportFactory, StatusFactory, UserFactory, STATUS_NAME
+import csv
 import io
 import json
+import tempfile
 
 fake = Faker()
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
 class TestKmGridImport(APITestCase):
     """
     TestCase for KmGrid import using command and admin page
@@ -189,6 +200,149 @@ class TestKmGridImport(APITestCase):
         )
         eq_(grid_count, len(geojson['features']))
 
+    def test_import_grid_assigns_lattice(self):
+        """
+        Test imported regular grids are addressed by lattice row and column.
+        Expected every grid in the example file to be in the lattice and
+            grid_id_contains to find the grid of its centroid.
+        """
+        f = io.StringIO()
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path)
+
+        eq_(KmGrid.objects.filter(lattice__isnull=True).count(), 0)
+        eq_(KmGridLattice.objects.count(), 1)
+
+        grid = KmGrid.objects.last()
+        eq_(KmGrid.objects.grid_id_contains(grid.geometry.centroid.json), grid.id)
+
+    def test_import_grid_in_batches_skips_invalid_features(self):
+        """
+        Test import_grid_from_geojson inserting grids in batches smaller than the file.
+        Expected every valid feature to be imported and the feature without population skipped.
+        """
+        geojson = dict(self.valid_geojson)
+        feature = self.valid_geojson['features'][0]
+        geojson['features'] = [feature] * 4 + [
+            {'type': 'Feature', 'properties': {}, 'geometry': feature['geometry']}
+        ]
+
+        with tempfile.NamedTemporaryFile('w', suffix='.geojson') as geojson_file:
+            json.dump(geojson, geojson_file)
+            geojson_file.flush()
+
+            f = io.StringIO()
+            with redirect_stdout(f):
+                import_grid_from_geojson(geojson_file.name, batch_size=2)
+
+        eq_('Imported 4/5' in f.getvalue(), True)
+        eq_(KmGrid.objects.count(), 4)
+
+    def test_import_grid_with_copy_method(self):
+        """
+        Test import_grid_from_geojson with COPY into a staging table.
+        Expected the same grids as the insert method and no duplicate on a second import.
+        """
+        f = io.StringIO()
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path)
+        expected = list(KmGrid.objects.order_by('id').values_list('population', flat=True))
+        KmGrid.objects.all().delete()
+
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path, batch_size=50, method='copy')
+        eq_(list(KmGrid.objects.order_by('id').values_list('population', flat=True)), expected)
+
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path, method='copy')
+        eq_(KmGrid.objects.count(), len(expected))
+        eq_(f'Imported 0/{len(expected)}' in f.getvalue(), True)
+
+    def test_import_grid_with_workers(self):
+        """
+        Test import_grid_from_geojson building grids in several processes.
+        Expected the same grids, in the same order, as a single process import.
+        """
+        fields = ('population', 'geometry')
+        f = io.StringIO()
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path)
+        expected = list(KmGrid.objects.order_by('id').values_list(*fields))
+        KmGrid.objects.all().delete()
+
+        for method in ('insert', 'copy'):
+            with redirect_stdout(f):
+                import_grid_from_geojson(self.valid_file_path, batch_size=20, method=method, workers=2)
+            eq_(list(KmGrid.objects.order_by('id').values_list(*fields)), expected)
+            KmGrid.objects.all().delete()
+
+    def test_import_grid_from_csv(self):
+        """
+        Test import_grid_from_file with a CSV file of hex WKB geometries.
+        Expected the same grids as the GeoJSON file.
+        """
+        fields = ('population', 'geometry')
+        f = io.StringIO()
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path)
+        expected = list(KmGrid.objects.order_by('id').values_list(*fields))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['population_count', 'WKB'])
+            for population, geometry in expected:
+                writer.writerow([population, geometry.hex.decode()])
+            csv_file.flush()
+
+            KmGrid.objects.all().delete()
+            with redirect_stdout(f):
+                import_grid_from_file(csv_file.name, batch_size=50)
+
+        eq_(list(KmGrid.objects.order_by('id').values_list(*fields)), expected)
+
+    def test_import_grid_upsert(self):
+        """
+        Test re-importing a new grid release with the upsert method.
+        Expected changed populations to be updated and rescored, new grids inserted,
+            missing grids deleted and other grids left as they are.
+        """
+        f = io.StringIO()
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path)
+        grids = list(KmGrid.objects.order_by('id'))
+        changed_grid, missing_grid = grids[0], grids[-1]
+
+        red_status = StatusFactory(name='We need medical help')
+        ReportFactory(grid=changed_grid, status=red_status, user=UserFactory())
+        grid_score = KmGridScore.objects.get(grid=changed_grid)
+
+        with open(self.valid_file_path) as geojson_file:
+            geojson = json.load(geojson_file)
+        geojson['features'][0]['properties']['population_count'] = changed_grid.population + 100
+        geojson['features'].pop()
+        new_feature = json.loads(json.dumps(self.valid_geojson['features'][0]))
+        geojson['features'].append(new_feature)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.geojson') as new_release:
+            json.dump(geojson, new_release)
+            new_release.flush()
+            with redirect_stdout(f):
+                import_grid_from_file(new_release.name, method='upsert', delete_missing=True)
+
+        eq_(KmGrid.objects.count(), len(grids))
+        eq_(KmGrid.objects.filter(id=missing_grid.id).exists(), False)
+        eq_(KmGrid.objects.filter(id__gt=grids[-1].id).count(), 1)
+        eq_(KmGrid.objects.get(id=changed_grid.id).population, changed_grid.population + 100)
+        eq_(KmGrid.objects.get(id=grids[1].id).population, grids[1].population)
+
+        grid_score.refresh_from_db()
+        eq_((grid_score.population, grid_score.count_red), (changed_grid.population + 100, 1))
+        self.assertAlmostEqual(
+            float(grid_score.score_red),
+            color_score_km_grid(1, changed_grid.population + 100, 'red'),
+            delta=0.01
+        )
+
     def test_url_to_import_kmgrid_can_be_opened(self):
         """
         Test Import KmGrid page can be opened in admin page.
@@ -209,7 +363,16 @@ class TestKmGridImport(APITestCase):
                 follow=True
             )
             eq_(response.status_code, http_status.HTTP_200_OK)
-            self.assertContains(response, 'Your GEOJSON file has been imported')
+            self.assertContains(response, 'Your GEOJSON file has been queued for import')
+
+            job = GridImportJob.objects.get()
+            eq_(job.status, GridImportJob.QUEUED)
+
+            with redirect_stdout(io.StringIO()):
+                eq_(process_grid_import_jobs(), 1)
+            job.refresh_from_db()
+            eq_(job.status, GridImportJob.DONE)
+            eq_(job.bytes_read, job.size)
 
             grid_count = KmGrid.objects.count()
             _, geojson = check_geojson_loadable(
@@ -218,6 +381,7 @@ class TestKmGridImport(APITestCase):
                 )[1]
             )
             eq_(grid_count, len(geojson['features']))
+            eq_((job.processed, job.imported, job.errors), (grid_count, grid_count, 0))
 
     def test_url_to_import_kmgrid_function_invalid_file(self):
         """
@@ -232,6 +396,7 @@ class TestKmGridImport(APITestCase):
             )
             eq_(response.status_code, http_status.HTTP_200_OK)
             self.assertContains(response, 'File is not a JSON file.')
+            eq_(GridImportJob.objects.count(), 0)
 
 
 class TestGenerateKmGridScore(APITestCase):
@@ -264,3 +429,37 @@ class TestGenerateKmGridScore(APITestCase):
         generated_grid_score = int(before.split('-- ')[-1])
 
         eq_(imported_grids, generated_grid_score)
+
+    def test_generate_grid_score_bulk_same_as_generate_grid_score(self):
+        """
+        Test bulk generation of KmGridScore gives the same numbers as generate_grid_score.
+        """
+        fields = (
+            'grid_id', 'population', 'total_report', 'total_score',
+            'count_green', 'score_green', 'count_yellow', 'score_yellow', 'count_red', 'score_red'
+        )
+        f = io.StringIO()
+        with redirect_stdout(f):
+            import_grid_from_geojson(self.valid_file_path)
+
+        statuses = [StatusFactory(name=name) for name in STATUS_NAME]
+        for num, grid in enumerate(KmGrid.objects.all()[:10]):
+            for _ in range(num % 4):
+                ReportFactory(grid=grid, status=statuses[num % 3], user=UserFactory())
+
+        KmGridScore.objects.all().delete()
+        with redirect_stdout(f):
+            generate_grid_score()
+        expected = {
+            grid_id: values
+            for grid_id, *values in KmGridScore.objects.values_list(*fields)
+        }
+
+        KmGridScore.objects.all().delete()
+        with redirect_stdout(f):
+            generate_grid_score_bulk(chunk_size=50)
+        generated = {
+            grid_id: values
+            for grid_id, *values in KmGridScore.objects.values_list(*fields)
+        }
+        eq_(generated, expected)
@@ -1,6 +1,25 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.test import TestCase, override_settings
 from nose.tools import eq_
-from ..utils.scoring_grid import color_score_km_grid, status_score_km_grid
+from ..utils.scoring_grid import color_score_km_grid, status_score_km_grid, \
+    color_score_km_grid_batch, status_score_km_grid_batch, score_km_grid_batch, round_score
+from ..utils.grid_index import GridIndex, get_grid_index, invalidate_grid_index
+from ..utils.grid_lattice import detect_lattice, WGS84
+from ..utils.geojson_stream import NotGeoJSONError, iter_feature_collection, write_feature_collection
+from ..utils.grid_formats import detect_format, geoparquet_srs, GridFormatError, \
+    FLATGEOBUF, GEOPARQUET, GEOJSON, CSV
+from ..utils.grid_score_cache import get_cache, cached_tile, cached_response_data, \
+    grid_score_watermark, invalidate_grid_score_extents, invalidate_grid_score_cache
+from ..utils.grid_score_push import EVENTS_PATH, GridScoreBroker, start_sse_server
+from ..utils.tiles import tile_for_point
+from ..models.report import Report
+from ..models.status import GREEN, YELLOW, RED, status_color
+from .factories import ReportFactory, StatusFactory
+import asyncio
+import io
+import json
+import tempfile
 
 
 class TestScoringGrid(TestCase):
@@ -40,6 +59,13 @@ class TestScoringGrid(TestCase):
         score = color_score_km_grid(self.count_green, self.population_1, 'green')
         eq_(score, 0.3)
 
+    def test_round_score_half_to_even(self):
+        """
+        Test a score half way between two cents is rounded to the even one
+        """
+        score = color_score_km_grid(1, 8, 'red')
+        eq_(round_score(score), 0.62)
+
     def test_score_total_with_higher_population(self):
         """
         Test total score for higher number of population
@@ -63,3 +89,490 @@ class TestScoringGrid(TestCase):
             self.population_2
         )
         eq_(score, 2)
+
+
+class TestGridIndex(TestCase):
+    """
+    TestCase for GridIndex
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        setup test data
+        """
+        cls.square = Polygon.from_bbox((0, 0, 1, 1))
+        cls.triangle = Polygon(((1, 0), (2, 0), (1, 1), (1, 0)))
+        cls.overlap = Polygon.from_bbox((0.5, 0.5, 1.5, 1.5))
+
+    def test_locate_point_inside_grid(self):
+        """
+        Test point inside rectangular and non rectangular grid
+        """
+        index = GridIndex([(1, self.square), (2, self.triangle)])
+        eq_(index.locate(0.5, 0.5), 1)
+        eq_(index.locate(1.2, 0.2), 2)
+
+    def test_locate_point_outside_grid(self):
+        """
+        Test point outside any grid, on the boundary, or outside the triangle but inside its bbox
+        """
+        index = GridIndex([(1, self.square), (2, self.triangle)])
+        eq_(index.locate(5, 5), None)
+        eq_(index.locate(1, 0.5), None)
+        eq_(index.locate(1.9, 0.9), None)
+
+    def test_locate_point_inside_overlapping_grid(self):
+        """
+        Test the highest grid ID is returned when grids overlap
+        """
+        index = GridIndex([(3, self.overlap), (1, self.square)])
+        eq_(index.locate(0.75, 0.75), 3)
+        eq_(index.locate(0.25, 0.25), 1)
+
+    def test_get_grid_index_rebuilt_after_invalidated(self):
+        """
+        Test the process-local index is reused until invalidated
+        """
+        invalidate_grid_index()
+        index = get_grid_index(lambda: GridIndex([(1, self.square)]))
+        eq_(get_grid_index(lambda: GridIndex([])), index)
+
+        invalidate_grid_index()
+        eq_(get_grid_index(lambda: GridIndex([])).locate(0.5, 0.5), None)
+        invalidate_grid_index()
+
+
+class TestGridLattice(TestCase):
+    """
+    TestCase for lattice detection
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        setup test data
+        """
+        cls.grids = [
+            (row * 3 + column, Polygon.from_bbox((column, -row - 1, column + 1, -row)))
+            for row in range(3) for column in range(3)
+        ]
+        cls.clipped = (9, Polygon(((3, 0), (4, 0), (3, -1), (3, 0))))
+
+    def test_detect_lattice(self):
+        """
+        Test equal cells are addressed by row and column and clipped cell is left out
+        """
+        lattice, cells = detect_lattice(self.grids + [self.clipped])
+        eq_(lattice.srid, WGS84)
+        eq_((lattice.rows, lattice.columns), (3, 3))
+        eq_(cells[0], (0, 0))
+        eq_(cells[5], (1, 2))
+        eq_(9 in cells, False)
+        eq_(lattice.cell(2.5, -1.5), (1, 2))
+        eq_(lattice.cell(2, -1.5), None)
+        eq_(lattice.cell(3.5, -0.5), None)
+
+    def test_detect_lattice_irregular_grids(self):
+        """
+        Test no lattice is detected when most grids are irregular
+        """
+        lattice, cells = detect_lattice([
+            self.clipped,
+            (10, Polygon(((0, 0), (2, 0), (0, 2), (0, 0)))),
+            (11, Polygon.from_bbox((0, 0, 2, 3)))
+        ])
+        eq_(lattice, None)
+        eq_(cells, {})
+
+    def test_locate_point_in_lattice(self):
+        """
+        Test GridIndex locates grid in lattice without geometry
+        """
+        lattice, cells = detect_lattice(self.grids)
+        index = GridIndex(
+            [self.clipped],
+            {1: lattice},
+            [(1, row, column, grid_id) for grid_id, (row, column) in cells.items()]
+        )
+        eq_(index.locate(1.5, -2.5), 7)
+        eq_(index.locate(3.2, -0.2), 9)
+        eq_(index.locate(5, 5), None)
+
+
+class TestScoringGridBatch(TestCase):
+    """
+    TestCase for vectorized ScoringGrid
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        setup test data
+        """
+        cls.count_green = [30, 30, 0, 5, 1, 0]
+        cls.count_yellow = [14, 14, 0, 0, 1, 3]
+        cls.count_red = [8, 8, 0, 0, 0, 0]
+        cls.population = [100, 60, 0, 10, 100, -5]
+
+    def test_score_batch_same_as_scalar(self):
+        """
+        Test color score and total score of every grid equal the scalar functions
+        """
+        population = [population or 1 for population in self.population]
+        scores = score_km_grid_batch(self.count_green, self.count_yellow, self.count_red, population)
+        for num in range(len(population)):
+            eq_(
+                scores['score_green'][num],
+                color_score_km_grid(self.count_green[num], population[num], 'green')
+            )
+            eq_(
+                scores['score_yellow'][num],
+                color_score_km_grid(self.count_yellow[num], population[num], 'yellow')
+            )
+            eq_(
+                scores['score_red'][num],
+                color_score_km_grid(self.count_red[num], population[num], 'red')
+            )
+
+    def test_status_score_batch_same_as_scalar(self):
+        """
+        Test total score including zero population, error_allowed and no yellow nor red report
+        """
+        for error_allowed in (0.0, 0.5):
+            scores = status_score_km_grid_batch(
+                self.count_green, self.count_yellow, self.count_red, self.population, error_allowed
+            )
+            expected = [
+                status_score_km_grid(green, yellow, red, population, error_allowed)
+                for green, yellow, red, population in zip(
+                    self.count_green, self.count_yellow, self.count_red, self.population
+                )
+            ]
+            eq_(scores.tolist(), expected)
+
+    def test_color_score_batch_zero_population(self):
+        """
+        Test zero population raises ZeroDivisionError, like color_score_km_grid
+        """
+        with self.assertRaises(ZeroDivisionError):
+            color_score_km_grid_batch([1], [0], 'red')
+
+
+class TestGeoJSONStream(TestCase):
+    """
+    TestCase for streaming GeoJSON reader
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        setup test data
+        """
+        with open(f'{settings.BASE_DIR}/../example/grid.geojson') as f:
+            cls.geojson_string = f.read()
+        cls.geojson = json.loads(cls.geojson_string)
+
+    def test_features_same_as_json_loads(self):
+        """
+        Test features are read the same whatever the chunk size
+        """
+        for chunk_size in (1, 10, 65536):
+            members = list(iter_feature_collection(io.StringIO(self.geojson_string), chunk_size))
+            eq_([value for key, value in members if key == 'features'], self.geojson['features'])
+            eq_([key for key, _ in members if key != 'features'], ['type', 'name', 'crs'])
+
+    def test_invalid_json(self):
+        """
+        Test non JSON document raises JSONDecodeError
+        """
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_feature_collection(io.StringIO('It is not valid')))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_feature_collection(io.StringIO('{"features": [{}, ')))
+
+    def test_invalid_json_raised_before_end_of_file(self):
+        """
+        Test a syntax error early in a large document is raised without reading the rest of it
+        """
+        document = io.StringIO('{"features": [{"type": Feature}, ' + '{}, ' * 10000 + '{}]}')
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_feature_collection(document, 64))
+        eq_(document.tell() < len(document.getvalue()) // 10, True)
+
+    def test_not_geojson(self):
+        """
+        Test JSON document without features list raises NotGeoJSONError
+        """
+        for document in ('[1, 2]', '{"type": "FeatureCollection"}', '{"features": 1}'):
+            with self.assertRaises(NotGeoJSONError):
+                list(iter_feature_collection(io.StringIO(document)))
+
+    def test_write_feature_collection(self):
+        """
+        Test written FeatureCollection is valid whatever the number of features
+        """
+        features = self.geojson['features']
+        for count in (0, 1, 3, len(features)):
+            written = ''.join(write_feature_collection(
+                (json.dumps(feature) for feature in features[:count]), batch_size=2
+            ))
+            eq_(json.loads(written), {'type': 'FeatureCollection', 'features': features[:count]})
+
+
+class TestGridFormats(TestCase):
+    """
+    TestCase for grid file format detection
+    """
+
+    def detect(self, content, suffix):
+        with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+            f.write(content)
+            f.flush()
+            return detect_format(f.name)
+
+    def test_detect_format_from_content(self):
+        """
+        Test format is detected from the first bytes whatever the extension
+        """
+        eq_(self.detect(b'fgb\x03fgb\x00', '.bin'), FLATGEOBUF)
+        eq_(self.detect(b'PAR1\x15\x04', '.bin'), GEOPARQUET)
+        eq_(self.detect(b'\n  {"type": "FeatureCollection"', '.bin'), GEOJSON)
+
+    def test_detect_format_from_extension(self):
+        """
+        Test format is detected from the extension for text formats
+        """
+        eq_(self.detect(b'wkt,population_count\n', '.csv'), CSV)
+        eq_(self.detect(b'wkt,population_count\n', '.txt'), None)
+
+    def test_geoparquet_srs(self):
+        """
+        Test the coordinate system of GeoParquet geometry columns,
+        None for WGS84 and an error when it is undefined
+        """
+        eq_(geoparquet_srs({'encoding': 'WKB'}), None)
+        eq_(geoparquet_srs({'crs': {'id': {'authority': 'EPSG', 'code': 4326}}}), None)
+        eq_(geoparquet_srs({'crs': {'id': {'authority': 'OGC', 'code': 'CRS84'}}}), None)
+        eq_(geoparquet_srs({'crs': {'id': {'authority': 'EPSG', 'code': 3857}}}).srid, 3857)
+        with self.assertRaises(GridFormatError):
+            geoparquet_srs({'crs': None})
+
+
+class TestGridScoreCache(TestCase):
+    """
+    TestCase for the grid score tile and response cache
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        self.rendered = []
+
+    def render(self, value):
+        def render():
+            self.rendered.append(value)
+            return value
+        return render
+
+    def test_tile_rendered_again_after_grid_changed(self):
+        """
+        Test only tiles covering the changed grid are rendered again
+        """
+        z = 10
+        x, y = tile_for_point(z, 107.6, -6.9)
+        eq_(cached_tile(z, x, y, self.render(b'a')), b'a')
+        eq_(cached_tile(z, x, y, self.render(b'b')), b'a')
+        eq_(cached_tile(z, 0, 0, self.render(b'c')), b'c')
+
+        invalidate_grid_score_extents([(107.59, -6.91, 107.6, -6.9)])
+        eq_(cached_tile(z, x, y, self.render(b'd')), b'd')
+        eq_(cached_tile(z, 0, 0, self.render(b'e')), b'c')
+        eq_(self.rendered, [b'a', b'c', b'd'])
+
+    def test_response_rendered_again_after_change_in_its_region(self):
+        """
+        Test responses are rendered again after a grid of their region changed, or the whole cache invalidated
+        """
+        region = (107.5, -7, 107.7, -6.8)
+
+        def cached(value):
+            watermark, _ = grid_score_watermark(extent=region)
+            return cached_response_data('/grid-score/?page=1', watermark, self.render(value))
+
+        eq_(cached([1]), [1])
+        eq_(cached([2]), [1])
+
+        invalidate_grid_score_extents([(0, 0, 0.01, 0.01)])
+        eq_(cached([3]), [1])
+
+        invalidate_grid_score_extents([(107.59, -6.91, 107.6, -6.9)])
+        eq_(cached([4]), [4])
+
+        invalidate_grid_score_cache()
+        eq_(cached([5]), [5])
+        eq_(cached_tile(0, 0, 0, self.render(b'f')), b'f')
+
+    def test_watermark_of_everywhere_changed_by_any_grid(self):
+        """
+        Test the watermark without region changes after a change of any grid
+        """
+        watermark = grid_score_watermark()
+        eq_(grid_score_watermark(), watermark)
+        invalidate_grid_score_extents([(0, 0, 0.01, 0.01)])
+        eq_(grid_score_watermark()[0] != watermark[0], True)
+
+
+@override_settings(
+    CACHES=dict(settings.CACHES, dummy={'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}),
+    GRID_SCORE_CACHE='dummy'
+)
+class TestGridScoreWithoutCache(TestCase):
+    """
+    TestCase for the grid score cache when the cache keeps nothing, like when it is unreachable
+    """
+
+    def test_everything_rendered(self):
+        """
+        Test tiles and responses are rendered on each request, and watermarks are new ones
+        """
+        eq_(cached_tile(0, 0, 0, lambda: b'a'), b'a')
+        eq_(cached_tile(0, 0, 0, lambda: b'b'), b'b')
+        watermark, _ = grid_score_watermark()
+        eq_(cached_response_data('/grid-score/?page=1', watermark, lambda: [1]), [1])
+        eq_(cached_response_data('/grid-score/?page=1', watermark, lambda: [2]), [2])
+        eq_(grid_score_watermark(extent=(107.5, -7, 107.7, -6.8))[0] != watermark, True)
+        invalidate_grid_score_extents([(0, 0, 0.01, 0.01)])
+        invalidate_grid_score_cache()
+
+
+class TestStatusColor(TestCase):
+    """
+    TestCase for status colors and their cache
+    """
+
+    def test_color_from_name(self):
+        """
+        Test new statuses get the color of their name keywords, whatever the case
+        """
+        eq_(StatusFactory(name='All Well Here').color, GREEN)
+        eq_(StatusFactory(name='Need Food or Supplies').color, YELLOW)
+        eq_(StatusFactory(name='We need supplies').color, YELLOW)
+        eq_(StatusFactory(name='We need Medical help').color, RED)
+        eq_(StatusFactory(name='Unknown').color, None)
+
+    def test_report_color_follows_saved_status(self):
+        """
+        Test reports are counted by the current color of their status after it is saved
+        """
+        status = StatusFactory(name='Unknown')
+        report = ReportFactory(status=status)
+        eq_(status_color(status.id), None)
+        eq_(Report.objects.red_report().filter(id=report.id).exists(), False)
+
+        status.color = RED
+        status.save()
+        eq_(status_color(status.id), 'red')
+        eq_(Report.objects.red_report().filter(id=report.id).exists(), True)
+
+
+class TestGridScorePush(TestCase):
+    """
+    TestCase for the grid score push server, with the in-process broker
+    """
+
+    def run_with_server(self, test, broker):
+        """
+        Run the coroutine function `test` with the port of a push server of the broker.
+        """
+        async def run():
+            server = await start_sse_server(broker, '127.0.0.1', 0)
+            broker_task = asyncio.ensure_future(broker.run())
+            try:
+                return await test(server.sockets[0].getsockname()[1])
+            finally:
+                # Clients are closed, their handlers end once they see it
+                for _ in range(100):
+                    if not broker.subscribers:
+                        break
+                    await asyncio.sleep(0.01)
+                broker_task.cancel()
+                server.close()
+                await server.wait_closed()
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+    async def connect(self, port, path=EVENTS_PATH, headers=''):
+        """
+        Send a request, return the reader, the writer and the status line.
+        """
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n'.encode())
+        status_line = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+        return reader, writer, status_line
+
+    async def read_event(self, reader):
+        """
+        Read the next event, return its ID and changes.
+        """
+        lines = (await asyncio.wait_for(reader.readuntil(b'\n\n'), 5)).decode().splitlines()
+        eq_(lines[1], 'event: grid_score')
+        return int(lines[0][len('id: '):]), json.loads(lines[2][len('data: '):])
+
+    def test_changes_coalesced_in_one_event(self):
+        """
+        Test changes published during a window are pushed in one event, latest change of each grid score,
+        with the cursor of the last publication as ID
+        """
+        broker = GridScoreBroker(window=0.05, cursor=10)
+
+        async def test(port):
+            reader, writer, status_line = await self.connect(port)
+            eq_(status_line.startswith(b'HTTP/1.1 200'), True)
+            while not broker.subscribers:
+                await asyncio.sleep(0.01)
+
+            broker.publish([{'id': 1, 'total_score': 0}, {'id': 2, 'total_score': 1}], 11)
+            broker.publish([{'id': 1, 'total_score': 2}], 12)
+            event = await self.read_event(reader)
+            writer.close()
+
+            _, writer, not_found_line = await self.connect(port, '/other')
+            writer.close()
+            eq_(not_found_line.startswith(b'HTTP/1.1 404'), True)
+            return event
+
+        cursor, changes = self.run_with_server(test, broker)
+        eq_(cursor, 12)
+        eq_(sorted(changes, key=lambda change: change['id']), [
+            {'id': 1, 'total_score': 2},
+            {'id': 2, 'total_score': 1},
+        ])
+
+    def test_resume_from_last_event_id(self):
+        """
+        Test clients resuming from an event ID, or the `since` cursor, first get the changes they missed
+        """
+        loaded = []
+
+        async def load_changes(since, until):
+            loaded.append((since, until))
+            return [{'id': 3, 'total_score': 1}]
+
+        broker = GridScoreBroker(window=0.05, load_changes=load_changes, cursor=20)
+
+        async def test(port):
+            events = []
+            for path, headers in ((EVENTS_PATH, 'Last-Event-ID: 15\r\n'), (f'{EVENTS_PATH}?since=18', '')):
+                reader, writer, _ = await self.connect(port, path, headers)
+                events.append(await self.read_event(reader))
+                writer.close()
+            return events
+
+        eq_(self.run_with_server(test, broker), [(20, [{'id': 3, 'total_score': 1}])] * 2)
+        eq_(loaded, [(15, 20), (18, 20)])
@@ -1,24 +1,37 @@
+from contextlib import redirect_stdout
 from django.urls import reverse
+from django.test import override_settings
 from django.conf import settings
+from django.db import connection, transaction
 from django.contrib.gis.geos import GEOSGeometry, Polygon
 from django.contrib.gis.db.models.functions import Centroid
 from django.core.paginator import Paginator
 from nose.tools import eq_
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status as http_status
 from faker import Faker
-from project.report.models.status import Status
+from unittest import mock
+from project.report.models.status import Status, invalidate_status_cache
 from project.report.models.user import User
-from project.report.models.report import Report
+from project.report.models.report import Report, bulk_create_reports
 from project.report.models.km_grid import KmGrid
 from project.report.models.km_grid_score import KmGridScore
-from .factories import StatusFactory, ReportFactory, UserFactory, KmGridFactory
+from project.report.models.queued_report import APPLY_LOCK_KEY, QueuedReport
+from project.report.serializers import KmGridScoreSerializer
+from .factories import StatusFactory, ReportFactory, UserFactory, KmGridFactory, KmGridScoreFactory
+from ..utils.scoring_grid import color_score_km_grid, status_score_km_grid
+from ..utils.grid_score_cache import get_cache, invalidate_grid_score_extents
+from ..utils.tiles import tile_for_point
 from project.users.test.factories import UserAdminFactory
 from project.report.management.commands.import_grid import import_grid_from_geojson
 from project.report.management.commands.generate_grid_score import generate_grid_score
+from project.report.management.commands.process_report_queue import process_report_queue
 
 import factory
+import io
 import json
+import threading
+import time
 
 fake = Faker()
 
@@ -59,6 +72,7 @@ class TestStatusListTestCase(TestStatusBaseClass):
         Set data for this test case.
         """
         self.url = reverse('status-list')
+        invalidate_status_cache()
 
     def test_list_status_succeeds_as_regular_user(self):
         """
@@ -85,6 +99,40 @@ class TestStatusListTestCase(TestStatusBaseClass):
         status_qs_page_1 = Paginator(status_qs, 1)
         eq_(response.data.get('count'), status_qs_page_1.count)
 
+    def test_list_status_not_modified(self):
+        """
+        List Status again with the ETag of the previous response.
+        Response status-code should be 304 Not Modified without querying the database,
+        then 200 OK with a new ETag once a Status is saved.
+        """
+        response = self.client.get(self.url)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        etag = response['ETag']
+        eq_('max-age' in response['Cache-Control'], True)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, http_status.HTTP_304_NOT_MODIFIED)
+        eq_(response['ETag'], etag)
+
+        self.status.description = 'Updated description'
+        self.status.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response['ETag'] != etag, True)
+
+    def test_list_status_etag_of_each_media_type(self):
+        """
+        List Status as JSON, then in the browsable API with the ETag of the JSON response.
+        Response status-code should be 200 OK with another ETag.
+        """
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json')
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response['ETag'] != etag, True)
+
 
 class TestStatusDetailTestCase(TestStatusBaseClass):
     """
@@ -103,6 +151,7 @@ class TestStatusDetailTestCase(TestStatusBaseClass):
         Set data for this test case.
         """
         self.url = reverse('status-detail', kwargs={'pk': self.status.pk})
+        invalidate_status_cache()
 
     def test_retrieve_status_as_admin_user(self):
         """
@@ -304,6 +353,148 @@ class TestReportListTestCase(TestReportBaseClass):
         report_1 = Report.objects.get(id=report_1['id'])
         eq_(report_1.current, False)
 
+    def test_update_old_report_keeps_current_report(self):
+        """
+        Save a previous Report of the user again.
+        The latest Report should stay the only current Report of the user.
+        """
+        report_1 = ReportFactory(user=self.user_1, grid=self.grid_1)
+        report_2 = ReportFactory(user=self.user_1, grid=self.grid_2)
+        report_1.refresh_from_db()
+        eq_(report_1.current, False)
+
+        report_1.save()
+
+        report_2.refresh_from_db()
+        eq_(report_2.current, True)
+        eq_(Report.objects.filter(user=self.user_1, current=True).count(), 1)
+
+    def test_create_report_updates_grid_score(self):
+        """
+        Create new Reports in a grid, then change the status of the user.
+        Grid score counts, color scores and total score should follow the reports.
+        """
+        red_status = StatusFactory(name='We need medical help')
+        green_status = StatusFactory(name='All is well')
+        self.post_request_with_data(dict(self.report_1_json, status=red_status.id))
+
+        grid_score = KmGridScore.objects.get(grid=self.grid_1)
+        eq_(grid_score.total_report, 1)
+        eq_(grid_score.count_red, 1)
+        eq_(float(grid_score.score_red), round(color_score_km_grid(1, self.grid_1.population, 'red'), 2))
+        eq_(grid_score.total_score, status_score_km_grid(0, 0, 1, self.grid_1.population))
+
+        self.post_request_with_data(dict(self.report_1_json, status=green_status.id))
+
+        grid_score.refresh_from_db()
+        eq_(grid_score.total_report, 1)
+        eq_((grid_score.count_green, grid_score.count_red), (1, 0))
+        eq_(float(grid_score.score_red), 0)
+        eq_(grid_score.total_score, 0)
+
+    @override_settings(REPORT_INGESTION_MODE='queue')
+    def test_create_report_queued_succeeds_as_regular_user(self):
+        """
+        Create new Reports in queue ingestion mode.
+        Response status-code should be 202 Accepted with the future Report ID.
+        Once the queue is processed, the Reports and grid score should be the same as in sync mode,
+        with the submission time of the queued Reports.
+        """
+        red_status = StatusFactory(name='We need medical help')
+        response = self.post_request_with_data(dict(self.report_1_json, status=red_status.id))
+        eq_(response.status_code, http_status.HTTP_202_ACCEPTED)
+        report_id = response.data['id']
+        eq_(Report.objects.filter(id=report_id).exists(), False)
+
+        response = self.post_request_with_data(self.report_2_json)
+        eq_(response.status_code, http_status.HTTP_202_ACCEPTED)
+        eq_(QueuedReport.objects.count(), 2)
+        submitted_at = QueuedReport.objects.get(report_id=report_id).timestamp
+
+        with redirect_stdout(io.StringIO()):
+            eq_(process_report_queue(), 2)
+        eq_(QueuedReport.objects.count(), 0)
+
+        report = Report.objects.get(id=report_id)
+        eq_(report.timestamp, submitted_at)
+        eq_(report.grid, self.grid_1)
+        eq_(report.current, False)
+        eq_(Report.objects.get(id=response.data['id']).current, True)
+
+        grid_score = KmGridScore.objects.get(grid=self.grid_1)
+        eq_((grid_score.total_report, grid_score.count_red), (1, 1))
+
+    def test_bulk_create_report_succeeds_as_regular_user(self):
+        """
+        Create Reports in bulk from a JSON array with one invalid item.
+        Response status-code should be 200 OK with the result of each item,
+        and the grid score should count the reports like single creates.
+        """
+        red_status = StatusFactory(name='We need medical help')
+        response = self.client.post(reverse('report-bulk'), [
+            dict(self.report_1_json, status=red_status.id),
+            dict(self.report_2_json, status=0),
+            self.report_2_json,
+        ], format='json')
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_((response.data['created'], response.data['failed']), (2, 1))
+
+        results = response.data['results']
+        eq_([result['status'] for result in results], [201, 400, 201])
+        eq_(list(results[1]['errors'].keys()), ['status'])
+        eq_(results[0]['grid'], self.grid_1.id)
+        eq_(results[2]['grid'], self.grid_2.id)
+
+        eq_(Report.objects.get(id=results[0]['id']).current, False)
+        eq_(Report.objects.get(id=results[2]['id']).current, True)
+
+        grid_score = KmGridScore.objects.get(grid=self.grid_1)
+        eq_((grid_score.total_report, grid_score.count_red), (1, 1))
+
+    def test_bulk_create_report_from_ndjson_succeeds_as_regular_user(self):
+        """
+        Create Reports in bulk from an NDJSON body.
+        Response status-code should be 200 OK and every report should be created.
+        """
+        body = '\n'.join(json.dumps(report) for report in (self.report_1_json, self.report_2_json))
+        response = self.client.post(reverse('report-bulk'), body, content_type='application/x-ndjson')
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response.data['created'], 2)
+        eq_(Report.objects.filter(id__in=[result['id'] for result in response.data['results']]).count(), 2)
+
+    def report_in_grid_deleted_by_another_process(self):
+        """
+        Report data located in a grid deleted without invalidating the process-local grid index,
+        like by another process.
+        """
+        grid = KmGridFactory()
+        centroid = KmGrid.objects.filter(id=grid.id).annotate(centroid=Centroid('geometry'))[0].centroid
+        eq_(KmGrid.objects.grid_id_contains(centroid.json), grid.id)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {KmGrid._meta.db_table} WHERE id = %s', [grid.id])
+        return dict(self.report_1_json, location={"type": "Point", "coordinates": [centroid.x, centroid.y]})
+
+    def test_create_report_in_grid_deleted_by_another_process(self):
+        """
+        Create new Report in a grid deleted by another process.
+        Response status-code should be 201 Created, the Report without grid.
+        """
+        response = self.post_request_with_data(self.report_in_grid_deleted_by_another_process())
+        eq_(response.status_code, http_status.HTTP_201_CREATED)
+        eq_(response.data['grid'], None)
+
+    def test_bulk_create_report_in_grid_deleted_by_another_process(self):
+        """
+        Create Reports in bulk, one in a grid deleted by another process.
+        Response status-code should be 200 OK, that Report created without grid.
+        """
+        response = self.client.post(reverse('report-bulk'), [
+            self.report_in_grid_deleted_by_another_process(),
+            self.report_2_json,
+        ], format='json')
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_([result['grid'] for result in response.data['results']], [None, self.grid_2.id])
+
     def test_list_report_fails_as_regular_user(self):
         """
         List Report as regular user.
@@ -362,6 +553,86 @@ class TestReportDetailTestCase(TestReportBaseClass):
         eq_(response.status_code, http_status.HTTP_200_OK)
 
 
+class TestReportConcurrencyTestCase(APITransactionTestCase):
+    """
+    Tests reports of a user created at the same time, like a double-tapped submit.
+    Each report is created in its own thread and connection, so they are committed.
+    """
+
+    def create_at_once(self, create, count=2):
+        """
+        Call `create` in `count` threads at once, return the exceptions raised.
+        """
+        barrier = threading.Barrier(count)
+        errors = []
+
+        def run():
+            try:
+                barrier.wait()
+                create()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_reports_created_at_once_keep_one_current(self):
+        """
+        Create reports of the same user at once, one by one then in bulk.
+        Every report should be created, and only the latest one should be current.
+        """
+        user = UserFactory()
+        status = StatusFactory(name='All Well Here')
+        Report.objects.create(user=user, status=status)
+
+        eq_(self.create_at_once(lambda: Report.objects.create(user=user, status=status)), [])
+        eq_(self.create_at_once(lambda: bulk_create_reports([Report(user=user, status=status)])), [])
+
+        eq_(Report.objects.filter(user=user).count(), 5)
+        eq_(
+            list(Report.objects.filter(user=user, current=True).values_list('id', flat=True)),
+            [Report.objects.filter(user=user).latest('id').id]
+        )
+
+    def test_queue_applied_by_one_worker_at_once(self):
+        """
+        Apply queued reports while another worker applies them.
+        Nothing should be applied until the other worker is done.
+        """
+        user = UserFactory()
+        status = StatusFactory(name='All Well Here')
+        QueuedReport.objects.enqueue(status=status, user=user)
+
+        locked = threading.Event()
+        done = threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_xact_lock(%s)', [APPLY_LOCK_KEY])
+                    locked.set()
+                    done.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            locked.wait(10)
+            eq_(QueuedReport.objects.apply_batch(), 0)
+        finally:
+            done.set()
+            thread.join()
+        eq_(QueuedReport.objects.apply_batch(), 1)
+        eq_(Report.objects.filter(user=user).count(), 1)
+
+
 class TestKmGridBaseClass(APITestCase):
     """
     Base Class for KmGrid test case.
@@ -462,6 +733,37 @@ class TestKmGridListTestCase(TestKmGridBaseClass):
         eq_(grid_geom, self.grid_1.geometry)
         eq_(grid['properties']['population'], self.grid_1.population)
 
+    def test_list_grid_geometry_output(self):
+        """
+        List KmGrid with centroid, bbox or rounded geometry.
+        Response grid-code should be 200 OK with the geometry in the requested shape,
+        and 400 Bad Request for an unknown shape.
+        """
+        params = {'contains_geom': json.dumps({
+            'type': 'Point', 'coordinates': [self.centroid_1.x, self.centroid_1.y]
+        })}
+
+        response = self.client.get(self.url, dict(params, geometry='centroid', precision=5))
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        grid = response.data['results']['features'][0]
+        eq_(grid['geometry']['type'], 'Point')
+        eq_(grid['geometry']['coordinates'], [round(self.centroid_1.x, 5), round(self.centroid_1.y, 5)])
+        eq_(grid['properties']['population'], self.grid_1.population)
+
+        response = self.client.get(self.url, dict(params, geometry='bbox', precision=5))
+        grid = response.data['results']['features'][0]
+        eq_(grid['geometry'], None)
+        eq_(grid['bbox'], [round(value, 5) for value in self.grid_1.geometry.extent])
+
+        response = self.client.get(self.url, dict(params, zoom=10))
+        grid = response.data['results']['features'][0]
+        eq_(grid['geometry']['type'], 'Polygon')
+        for coordinate in grid['geometry']['coordinates'][0]:
+            eq_(coordinate, [round(value, 3) for value in coordinate])
+
+        response = self.client.get(self.url, dict(params, geometry='triangle'))
+        eq_(response.status_code, http_status.HTTP_400_BAD_REQUEST)
+
 
 class TestKmGridDetailTestCase(TestKmGridBaseClass):
     """
@@ -548,6 +850,7 @@ class TestKmGridScoreListTestCase(TestKmGridScoreBaseClass):
         Set data for this test case.
         """
         self.url = reverse('kmgridscore-list')
+        get_cache().clear()
 
     def test_list_grid_score_succeeds_as_regular_user(self):
         """
@@ -631,9 +934,119 @@ class TestKmGridScoreListTestCase(TestKmGridScoreBaseClass):
             geometry__bboverlaps=Polygon.from_bbox(self.bbox)
         )
 
-        grid_score_page_1 = response.data['features']
+        eq_(response.streaming, True)
+        grid_score_page_1 = json.loads(b''.join(response.streaming_content))['features']
         eq_(len(grid_score_page_1), filtered_grid_score.count())
 
+    def test_not_paginated_same_as_serializer(self):
+        """
+        List KmGridScore without pagination, built by PostgreSQL and streamed.
+        Features should be the same as the serializer ones, with coordinates rounded to the precision.
+        """
+        param = "?total_score=0&no_page&precision=4"
+        response = self.client.get(self.url + param)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response['Content-Type'], 'application/json')
+
+        feature_collection = json.loads(b''.join(response.streaming_content))
+        expected = KmGridScoreSerializer(KmGridScore.objects.green_grid(), many=True).data
+        eq_(feature_collection['type'], 'FeatureCollection')
+        eq_(len(feature_collection['features']), len(expected['features']))
+        for feature, expected_feature in zip(feature_collection['features'], expected['features']):
+            eq_(feature['id'], expected_feature['id'])
+            eq_(feature['properties'], dict(expected_feature['properties']))
+            for coordinate, expected_coordinate in zip(
+                    feature['geometry']['coordinates'][0], expected_feature['geometry']['coordinates'][0]):
+                eq_(coordinate, [round(value, 4) for value in expected_coordinate])
+
+        response = self.client.get(self.url + '?no_page&precision=99')
+        eq_(response.status_code, http_status.HTTP_400_BAD_REQUEST)
+
+    def test_list_grid_score_not_modified(self):
+        """
+        List KmGridScore in a bbox again with the ETag or Last-Modified of the previous response.
+        Response grid-code should be 304 Not Modified without querying the database,
+        until a grid score in the bbox changes.
+        Last-Modified should only be sent once the second of the last change is over.
+        """
+        param = f"?in_bbox={','.join([str(x) for x in self.bbox])}"
+        response = self.client.get(self.url + param)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response.has_header('Last-Modified'), False)
+
+        with mock.patch('project.report.views.time') as views_time:
+            views_time.time.return_value = time.time() + 2
+            response = self.client.get(self.url + param)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url + param, HTTP_IF_NONE_MATCH=etag)
+            eq_(response.status_code, http_status.HTTP_304_NOT_MODIFIED)
+            response = self.client.get(self.url + param, HTTP_IF_MODIFIED_SINCE=last_modified)
+            eq_(response.status_code, http_status.HTTP_304_NOT_MODIFIED)
+
+        # Changed far from the bbox
+        invalidate_grid_score_extents([(18.48, -33.97, 18.49, -33.96)])
+        response = self.client.get(self.url + param, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, http_status.HTTP_304_NOT_MODIFIED)
+
+        grid_score = KmGridScore.objects.filter(geometry__bboverlaps=Polygon.from_bbox(self.bbox)).first()
+        invalidate_grid_score_extents([grid_score.geometry.extent])
+        response = self.client.get(self.url + param, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response['ETag'] != etag, True)
+
+    def test_list_grid_score_etag_of_each_media_type(self):
+        """
+        List KmGridScore in a bbox as JSON, then in the browsable API with the ETag of the JSON response.
+        Response grid-code should be 200 OK with another ETag, both varying on Accept.
+        """
+        param = f"?in_bbox={','.join([str(x) for x in self.bbox])}"
+        response = self.client.get(self.url + param, HTTP_ACCEPT='application/json')
+        eq_('Accept' in response['Vary'], True)
+        etag = response['ETag']
+
+        response = self.client.get(self.url + param, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_('Accept' in response['Vary'], True)
+        eq_(response['ETag'] != etag, True)
+
+    def test_grid_score_tile_succeeds(self):
+        """
+        Get KmGridScore vector tile containing a grid.
+        Response grid-code should be 200 OK with a cacheable Mapbox Vector Tile.
+        A tile without grid score should be empty, a tile out of the zoom level should be 404 Not Found.
+        """
+        z = 12
+        x, y = tile_for_point(z, self.centroid_1.x, self.centroid_1.y)
+        response = self.client.get(reverse('kmgridscore-tile', kwargs={'z': z, 'x': x, 'y': y}))
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        eq_('max-age=60' in response['Cache-Control'], True)
+        eq_(b'grid_score' in response.content, True)
+
+        response = self.client.get(reverse('kmgridscore-tile', kwargs={'z': z, 'x': 0, 'y': 0}))
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        eq_(response.content, b'')
+
+        response = self.client.get(reverse('kmgridscore-tile', kwargs={'z': 1, 'x': 2, 'y': 0}))
+        eq_(response.status_code, http_status.HTTP_404_NOT_FOUND)
+
+    @override_settings(
+        CACHES=dict(settings.CACHES, dummy={'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}),
+        GRID_SCORE_CACHE='dummy'
+    )
+    def test_grid_score_without_cache(self):
+        """
+        List KmGridScore and get a tile while the grid score cache keeps nothing, like when it is unreachable.
+        Response grid-code should be 200 OK.
+        """
+        eq_(self.client.get(self.url, {'page': 1}).status_code, http_status.HTTP_200_OK)
+        eq_(self.client.get(self.url, {'no_page': ''}).status_code, http_status.HTTP_200_OK)
+        response = self.client.get(reverse('kmgridscore-tile', kwargs={'z': 12, 'x': 0, 'y': 0}))
+        eq_(response.status_code, http_status.HTTP_200_OK)
 
 class TestKmGridScoreDetailTestCase(TestKmGridScoreBaseClass):
     """
@@ -671,3 +1084,60 @@ class TestKmGridScoreDetailTestCase(TestKmGridScoreBaseClass):
         url = reverse('kmgridscore-detail', kwargs={'pk': self.grid_1.id})
         response = self.client.get(url, format='json')
         eq_(response.status_code, http_status.HTTP_200_OK)
+
+
+class TestKmGridScoreChangesTestCase(APITransactionTestCase):
+    """
+    Tests /grid-score/changes operations.
+    Grid score versions are transaction IDs, so changes have to be committed.
+    """
+
+    def setUp(self):
+        """
+        Set data for this test case.
+        """
+        self.url = reverse('kmgridscore-changes')
+        self.grid_scores = [KmGridScoreFactory(population=50) for _ in range(3)]
+
+    def get_changes(self, since):
+        response = self.client.get(self.url, {'since': since})
+        eq_(response.status_code, http_status.HTTP_200_OK)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_changes_since_cursor(self):
+        """
+        Get the grid score changes, then the changes since the returned cursor.
+        Only changed grid scores should be returned, and deleted ones in `deleted`.
+        """
+        changes = self.get_changes(0)
+        eq_(
+            sorted(feature['id'] for feature in changes['features']),
+            sorted(grid_score.id for grid_score in self.grid_scores)
+        )
+        eq_(changes['deleted'], [])
+        cursor = changes['cursor']
+
+        eq_(self.get_changes(cursor)['features'], [])
+
+        changed, deleted, _ = self.grid_scores
+        KmGridScore.objects.filter(id=changed.id).apply_report_delta(red=1, total_report=1)
+        KmGridScore.objects.filter(id=deleted.id).delete()
+
+        changes = self.get_changes(cursor)
+        eq_([feature['id'] for feature in changes['features']], [changed.id])
+        eq_(changes['deleted'], [deleted.id])
+        eq_(changes['cursor'] > cursor, True)
+
+        response = self.client.get(self.url, {'since': -1})
+        eq_(response.status_code, http_status.HTTP_400_BAD_REQUEST)
+
+    def test_changes_not_filtered_by_values(self):
+        """
+        Get the grid score changes with a filter on grid score values.
+        Response status-code should be 400 Bad Request, as grid scores changed out of
+        the filter would be neither in the features nor deleted.
+        """
+        for param in ('total_score', 'min_total_report', 'max_population'):
+            response = self.client.get(self.url, {'since': 0, param: 1})
+            eq_(response.status_code, http_status.HTTP_400_BAD_REQUEST)
+            eq_(param in response.data, True)
@@ -0,0 +1,12 @@
+def chunked(iterable, size):
+    """
+    Split an iterable in lists of `size` items, the last one may be shorter.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,180 @@
+import json
+
+WHITESPACE = ' \t\n\r'
+
+# A decode error this close to the end of the window may be a token cut by
+# the window, like `-Infinity` or a `\uXXXX` escape
+MAX_TRUNCATED_TOKEN = 16
+
+
+class NotGeoJSONError(ValueError):
+    """
+    Raised when the document is valid JSON but not a GeoJSON FeatureCollection.
+    """
+
+
+class JSONStream(object):
+    """
+    Incremental reader of a JSON document from a text file.
+
+    Only a window of the file is kept in memory. Values are decoded one at
+    a time with `json.JSONDecoder.raw_decode`, reading more of the file
+    whenever the window ends in the middle of a value.
+    """
+
+    def __init__(self, file, chunk_size=65536):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self):
+        """
+        Append the next chunk of the file to the window.
+        Already decoded text is dropped first.
+        """
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buffer += chunk
+        return bool(chunk)
+
+    def error(self, message):
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def peek(self):
+        """
+        Return the next non-whitespace character without consuming it,
+        or an empty string at the end of the file.
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ''
+
+    def expect(self, characters):
+        """
+        Consume the next non-whitespace character, which must be one of `characters`.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise self.error(f'Expecting one of {characters!r}')
+        self.pos += 1
+        return character
+
+    def truncated(self, error):
+        """
+        Whether the decode error may come from the window ending in the middle
+        of the value, rather than from invalid JSON.
+        """
+        if error.msg.startswith('Unterminated string'):
+            return True
+        return len(self.buffer) - error.pos <= MAX_TRUNCATED_TOKEN
+
+    def value(self):
+        """
+        Decode the next complete JSON value.
+        Invalid JSON is raised right away, without reading the rest of the file.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as error:
+                if self.truncated(error) and self.read_more():
+                    continue
+                raise
+            # A number may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_feature_collection(file, chunk_size=65536):
+    """
+    Iterate over a GeoJSON FeatureCollection without loading the whole file.
+
+    ::params::
+    file : text file containing the GeoJSON
+    chunk_size : number of characters read at once
+
+    ::return :: (key, value) for every top level member except features,
+        and ('features', feature) for every feature in the collection
+    ::return type :: generator of (string, object)
+
+    Raises json.JSONDecodeError if the file is not JSON and
+    NotGeoJSONError if it is not a JSON object with a features list.
+    """
+    stream = JSONStream(file, chunk_size)
+    if stream.peek() != '{':
+        stream.value()
+        raise NotGeoJSONError('Document is not a JSON object')
+    stream.expect('{')
+
+    if stream.peek() == '}':
+        stream.expect('}')
+        raise NotGeoJSONError('Document has no features')
+
+    has_features = False
+    while True:
+        key = stream.value()
+        stream.expect(':')
+
+        if key == 'features':
+            if stream.peek() != '[':
+                raise NotGeoJSONError('Features is not a list')
+            has_features = True
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.expect(']')
+            else:
+                while True:
+                    yield key, stream.value()
+                    if stream.expect(',]') == ']':
+                        break
+        else:
+            yield key, stream.value()
+
+        if stream.expect(',}') == '}':
+            break
+
+    if stream.peek():
+        raise stream.error('Extra data')
+    if not has_features:
+        raise NotGeoJSONError('Document has no features')
+
+
+def write_feature_collection(features, batch_size=100, members=None):
+    """
+    Write a GeoJSON FeatureCollection a few features at a time.
+
+    ::params::
+    features : iterable of features already encoded as JSON strings
+    batch_size : number of features per yielded string
+    members : dict of other members of the FeatureCollection, written before the features
+
+    ::return type :: generator of string
+    """
+    head = {'type': 'FeatureCollection'}
+    head.update(members or {})
+    yield json.dumps(head)[:-1] + ', "features": ['
+    separator = ''
+    batch = []
+    for feature in features:
+        batch.append(feature)
+        if len(batch) >= batch_size:
+            yield separator + ', '.join(batch)
+            separator = ', '
+            batch = []
+    if batch:
+        yield separator + ', '.join(batch)
+    yield ']}'
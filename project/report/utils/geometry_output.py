@@ -0,0 +1,99 @@
+from django.db import connection
+from django.db.models import TextField
+from django.db.models.expressions import RawSQL
+import math
+
+POLYGON = 'polygon'
+CENTROID = 'centroid'
+BBOX = 'bbox'
+GEOMETRY_SHAPES = (POLYGON, CENTROID, BBOX)
+
+MAX_PRECISION = 15
+
+# Size in pixels of the map tiles the zoom level refers to
+TILE_SIZE = 256
+
+
+def zoom_tolerance(zoom):
+    """
+    Simplification tolerance in degrees at a zoom level, half a pixel at the equator.
+    """
+    return 360.0 / (TILE_SIZE * 2 ** zoom) / 2
+
+
+def zoom_precision(zoom):
+    """
+    Number of decimal digits needed to place coordinates on the right pixel at a zoom level.
+    """
+    return min(max(math.ceil(math.log10(TILE_SIZE * 2 ** zoom / 360.0)), 0), MAX_PRECISION)
+
+
+class GeometryOutput(object):
+    """
+    How the geometry of grids is written in GeoJSON output, computed by PostGIS:
+    polygons with coordinates rounded to `precision` decimal digits, simplified
+    for the `zoom` level when given, or only their centroid, or only their bbox.
+    """
+
+    def __init__(self, shape=POLYGON, precision=6, zoom=None):
+        self.shape = shape
+        self.precision = precision
+        self.zoom = zoom
+
+    @property
+    def tolerance(self):
+        if self.zoom is None:
+            return None
+        return zoom_tolerance(self.zoom)
+
+    def geometry_sql(self, column):
+        """
+        SQL expression of the geometry as GeoJSON text, NULL when only the bbox is written.
+
+        ::params::
+        column : quoted geometry column
+
+        ::return :: (sql, params)
+        """
+        if self.shape == BBOX:
+            return 'NULL::text', []
+        if self.shape == CENTROID:
+            return f'ST_AsGeoJSON(ST_Centroid({column}), %s)', [self.precision]
+        if self.tolerance is not None:
+            return (
+                f'ST_AsGeoJSON(ST_SimplifyPreserveTopology({column}, %s), %s)',
+                [self.tolerance, self.precision]
+            )
+        return f'ST_AsGeoJSON({column}, %s)', [self.precision]
+
+    def bbox_sql(self, column):
+        """
+        SQL expression of the [min x, min y, max x, max y] bbox as JSON text,
+        NULL unless only the bbox is written.
+
+        ::params::
+        column : quoted geometry column
+
+        ::return :: (sql, params)
+        """
+        if self.shape != BBOX:
+            return 'NULL::text', []
+        sql = 'json_build_array({})::text'.format(', '.join(
+            f'round({function}({column})::numeric, %s)::float'
+            for function in ('ST_XMin', 'ST_YMin', 'ST_XMax', 'ST_YMax')
+        ))
+        return sql, [self.precision] * 4
+
+    def annotate(self, queryset, field='geometry'):
+        """
+        Annotate `output_geometry` and `output_bbox` to the queryset, read by
+        OutputGeometryField instead of the geometry, which is not fetched.
+        """
+        column = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.get_field(field).column)
+        )
+        return queryset.defer(field).annotate(
+            output_geometry=RawSQL(*self.geometry_sql(column), output_field=TextField()),
+            output_bbox=RawSQL(*self.bbox_sql(column), output_field=TextField()),
+        )
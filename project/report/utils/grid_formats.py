@@ -0,0 +1,186 @@
+from django.contrib.gis.gdal import DataSource, GDALException, OGRGeometry, SpatialReference, SRSException
+import csv
+import json
+import os
+
+GEOJSON = 'geojson'
+FLATGEOBUF = 'flatgeobuf'
+GEOPARQUET = 'geoparquet'
+CSV = 'csv'
+GRID_FORMATS = (GEOJSON, FLATGEOBUF, GEOPARQUET, CSV)
+
+POPULATION_FIELD = 'population_count'
+
+# GeoParquet CRS identifiers of WGS84 longitude/latitude, OGC:CRS84 is the default
+WGS84_CRS_IDS = (('OGC', 'CRS84'), ('EPSG', '4326'))
+
+# Column holding WKT or hex WKB geometry in CSV files, first match is used
+CSV_GEOMETRY_COLUMNS = ('wkt', 'wkb', 'geometry', 'geom', 'the_geom')
+
+EXTENSIONS = {
+    '.geojson': GEOJSON,
+    '.json': GEOJSON,
+    '.fgb': FLATGEOBUF,
+    '.parquet': GEOPARQUET,
+    '.geoparquet': GEOPARQUET,
+    '.csv': CSV,
+}
+
+
+class GridFormatError(ValueError):
+    """
+    Raised when a grid file can not be read in the requested format.
+    """
+
+
+def detect_format(file_path):
+    """
+    Detect format of a grid file from its first bytes, then its extension.
+
+    ::params::
+    file_path : path of the grid file
+
+    ::return :: one of GRID_FORMATS, or None if unknown
+    ::return type :: string
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(1024)
+    if head.startswith(b'fgb'):
+        return FLATGEOBUF
+    if head.startswith(b'PAR1'):
+        return GEOPARQUET
+    if head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'{'):
+        return GEOJSON
+    return EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+
+
+def grid_feature(geometry, population):
+    """
+    Feature in the shape expected by grid_from_feature.
+    Geometry is a GeoJSON dict, a WKT or hex WKB string, or WKB bytes.
+    """
+    properties = {}
+    if population is not None:
+        properties[POPULATION_FIELD] = population
+    return {'geometry': geometry, 'properties': properties}
+
+
+def read_flatgeobuf(file_path):
+    """
+    Iterate over features of a FlatGeobuf file, read with GDAL.
+    Geometries are transformed to WGS84 when the file uses another coordinate system.
+    """
+    data_source = DataSource(file_path)
+    layer = data_source[0]
+    transform = layer.srs is not None and layer.srs.srid != 4326
+    has_population = POPULATION_FIELD in layer.fields
+
+    for feature in layer:
+        geometry = feature.geom
+        if transform:
+            geometry.transform(4326)
+        population = feature.get(POPULATION_FIELD) if has_population else None
+        yield grid_feature(bytes(geometry.wkb), population)
+
+
+def geoparquet_srs(column):
+    """
+    Coordinate system of a GeoParquet geometry column.
+    A column without crs is in OGC:CRS84, WGS84 longitude/latitude.
+
+    ::params::
+    column : metadata of the geometry column, from the geo metadata of the file
+
+    ::return :: SpatialReference to transform from, or None for WGS84
+    ::return type :: SpatialReference
+    """
+    if 'crs' not in column:
+        return None
+    crs = column['crs']
+    if crs is None:
+        raise GridFormatError('GeoParquet geometry column has an undefined CRS')
+
+    srs_input = crs
+    if isinstance(crs, dict):
+        crs_id = crs.get('id') or {}
+        authority, code = str(crs_id.get('authority', '')).upper(), str(crs_id.get('code', ''))
+        if (authority, code) in WGS84_CRS_IDS:
+            return None
+        # PROJJSON, by its EPSG code when it has one
+        srs_input = int(code) if authority == 'EPSG' and code.isdigit() else json.dumps(crs)
+    try:
+        srs = SpatialReference(srs_input)
+    except (GDALException, SRSException):
+        raise GridFormatError(f'Unsupported GeoParquet CRS {srs_input}')
+    return None if srs.srid == 4326 else srs
+
+
+def read_geoparquet(file_path):
+    """
+    Iterate over features of a GeoParquet file, one row group in memory at a time.
+    Geometries are transformed to WGS84 when the file uses another coordinate system.
+    Needs the optional pyarrow package.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise GridFormatError('Reading GeoParquet needs the pyarrow package')
+
+    parquet_file = pq.ParquetFile(file_path)
+    metadata = parquet_file.schema.to_arrow_schema().metadata or {}
+    if b'geo' not in metadata:
+        raise GridFormatError('Parquet file has no GeoParquet metadata')
+    geo = json.loads(metadata[b'geo'])
+    geometry_column = geo['primary_column']
+    encoding = geo['columns'][geometry_column].get('encoding', 'WKB')
+    if encoding.upper() != 'WKB':
+        raise GridFormatError(f'Unsupported GeoParquet geometry encoding {encoding}')
+    srs = geoparquet_srs(geo['columns'][geometry_column])
+
+    columns = [geometry_column]
+    has_population = POPULATION_FIELD in parquet_file.schema.names
+    if has_population:
+        columns.append(POPULATION_FIELD)
+
+    for row_group in range(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(row_group, columns=columns)
+        geometries = table.column(geometry_column).to_pylist()
+        populations = table.column(POPULATION_FIELD).to_pylist() if has_population \
+            else [None] * len(geometries)
+        for geometry, population in zip(geometries, populations):
+            if srs is not None and geometry is not None:
+                geometry = OGRGeometry(memoryview(geometry), srs=srs)
+                geometry.transform(4326)
+                geometry = bytes(geometry.wkb)
+            yield grid_feature(geometry, population)
+
+
+def read_csv(file_path):
+    """
+    Iterate over features of a CSV file with a WKT or hex WKB geometry column.
+    """
+    with open(file_path, newline='') as f:
+        reader = csv.DictReader(f)
+        fields = {field.lower(): field for field in reader.fieldnames or ()}
+        geometry_column = next(
+            (fields[column] for column in CSV_GEOMETRY_COLUMNS if column in fields), None
+        )
+        if geometry_column is None:
+            raise GridFormatError(
+                'CSV file has no geometry column, expected one of {}'.format(', '.join(CSV_GEOMETRY_COLUMNS))
+            )
+        population_column = fields.get(POPULATION_FIELD)
+
+        for row in reader:
+            try:
+                population = float(row[population_column]) if population_column else None
+            except ValueError:
+                population = None
+            yield grid_feature(row[geometry_column], population)
+
+
+GRID_READERS = {
+    FLATGEOBUF: read_flatgeobuf,
+    GEOPARQUET: read_geoparquet,
+    CSV: read_csv,
+}
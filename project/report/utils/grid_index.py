@@ -0,0 +1,150 @@
+from django.contrib.gis.geos import Point
+from .grid_lattice import rectangle_extent
+import math
+import threading
+import time
+
+# Process-local index shared by every request handled by this worker
+_index = None
+_index_built_at = 0
+_index_lock = threading.Lock()
+
+
+class GridIndex(object):
+    """
+    In-memory spatial index mapping a coordinate to KmGrid ID.
+
+    Grids belonging to a regular lattice are addressed by (row, column)
+    computed from the coordinate. Other grids are stored in uniform buckets
+    sized after the median grid extent, so a lookup only checks the handful
+    of grids sharing the point's bucket. Axis-aligned rectangular grids are
+    checked against their bounding box, other shapes against a prepared
+    GEOS geometry.
+    """
+
+    def __init__(self, grids, lattices=None, cells=()):
+        """
+        ::params::
+        grids : iterable of (grid ID, grid geometry) checked geometrically
+        lattices : {lattice ID: Lattice}
+        cells : iterable of (lattice ID, row, column, grid ID) addressed arithmetically
+
+        ::params type::
+        grids : iterable of (integer, GEOSGeometry)
+        lattices : dict
+        cells : iterable of (integer, integer, integer, integer)
+        """
+        entries = []
+        for grid_id, geometry in grids:
+            if geometry is None or geometry.empty:
+                continue
+            extent = rectangle_extent(geometry)
+            if extent is not None:
+                entries.append((grid_id,) + extent + (None,))
+            else:
+                entries.append((grid_id,) + geometry.extent + (geometry.prepared,))
+
+        self.lattices = lattices or {}
+        self.cells = {}
+        for lattice_id, row, column, grid_id in cells:
+            self.cells[(lattice_id, row, column)] = grid_id
+
+        self.size = len(entries) + len(self.cells)
+        self.bucket_size = median_extent(entries)
+        self.buckets = {}
+        for entry in entries:
+            for key in self.bucket_keys(*entry[1:5]):
+                self.buckets.setdefault(key, []).append(entry)
+
+    def bucket_keys(self, min_x, min_y, max_x, max_y):
+        """
+        Return keys of every bucket overlapped by the bounding box.
+        """
+        size = self.bucket_size
+        for col in range(math.floor(min_x / size), math.floor(max_x / size) + 1):
+            for row in range(math.floor(min_y / size), math.floor(max_y / size) + 1):
+                yield col, row
+
+    def locate(self, x, y):
+        """
+        Find the grid containing the coordinate.
+
+        Points on a grid boundary are not contained, just like
+        `geometry__contains`. When several grids contain the point,
+        the one with the highest ID wins, as KmGrid is ordered by `-id`.
+
+        ::params::
+        x : longitude of the point
+        y : latitude of the point
+
+        ::return :: ID of the grid or None
+        ::return type :: integer
+        """
+        if not self.size:
+            return None
+
+        found = None
+        for lattice_id, lattice in self.lattices.items():
+            cell = lattice.cell(x, y)
+            if cell is not None:
+                grid_id = self.cells.get((lattice_id,) + cell)
+                if grid_id is not None and (found is None or grid_id > found):
+                    found = grid_id
+
+        key = (math.floor(x / self.bucket_size), math.floor(y / self.bucket_size))
+        point = None
+        for grid_id, min_x, min_y, max_x, max_y, prepared in self.buckets.get(key, ()):
+            if not (min_x < x < max_x and min_y < y < max_y):
+                continue
+            if found is not None and grid_id < found:
+                continue
+            if prepared is not None:
+                if point is None:
+                    point = Point(x, y, srid=4326)
+                if not prepared.contains(point):
+                    continue
+            found = grid_id
+        return found
+
+
+def median_extent(entries):
+    """
+    Median of the larger side of the entries' bounding boxes, used as bucket size.
+    """
+    sides = sorted(
+        max(max_x - min_x, max_y - min_y) for _, min_x, min_y, max_x, max_y, _ in entries
+    )
+    sides = [side for side in sides if side > 0]
+    if not sides:
+        return 1.0
+    return sides[len(sides) // 2]
+
+
+def get_grid_index(loader, ttl=0):
+    """
+    Return the process-local GridIndex, building it with `loader` when needed.
+
+    ::params::
+    loader : callable returning a GridIndex
+    ttl : maximum age of the index in seconds, 0 means no expiry
+
+    ::return type :: GridIndex
+    """
+    global _index, _index_built_at
+
+    with _index_lock:
+        expired = ttl and time.monotonic() - _index_built_at > ttl
+        if _index is None or expired:
+            _index = loader()
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def invalidate_grid_index():
+    """
+    Drop the process-local GridIndex so the next lookup rebuilds it.
+    """
+    global _index
+
+    with _index_lock:
+        _index = None
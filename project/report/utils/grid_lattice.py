@@ -0,0 +1,220 @@
+import math
+
+WGS84 = 4326
+WEB_MERCATOR = 3857
+EARTH_RADIUS = 6378137.0
+
+
+def project(x, y, srid=WEB_MERCATOR):
+    """
+    Project WGS84 coordinate to the lattice coordinate system.
+
+    ::params::
+    x : longitude
+    y : latitude
+    srid : SRID of lattice coordinate system (4326 or 3857)
+
+    ::return :: (x, y) in lattice coordinate system
+    ::return type :: (float, float)
+    """
+    if srid == WEB_MERCATOR:
+        return (
+            EARTH_RADIUS * math.radians(x),
+            EARTH_RADIUS * math.log(math.tan(math.pi / 4 + math.radians(y) / 2))
+        )
+    return x, y
+
+
+class Lattice(object):
+    """
+    Regular lattice of axis-aligned cells of equal size.
+    Row 0, column 0 is the top-left cell, rows grow southward and columns eastward.
+    """
+
+    def __init__(self, srid, origin_x, origin_y, cell_width, cell_height, rows, columns):
+        self.srid = srid
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.rows = rows
+        self.columns = columns
+
+    def position(self, x, y):
+        """
+        Fractional (row, column) of a WGS84 coordinate.
+        """
+        px, py = project(x, y, self.srid)
+        return (self.origin_y - py) / self.cell_height, (px - self.origin_x) / self.cell_width
+
+    def cell(self, x, y, tolerance=1e-6):
+        """
+        Find (row, column) of the cell containing a WGS84 coordinate.
+
+        ::params::
+        x : longitude
+        y : latitude
+        tolerance : fraction of cell size treated as cell boundary
+
+        ::return :: (row, column), or None if the coordinate is outside
+            the lattice or too close to a cell boundary to decide
+        ::return type :: (integer, integer)
+        """
+        try:
+            row_position, column_position = self.position(x, y)
+        except ValueError:
+            return None
+
+        row, column = math.floor(row_position), math.floor(column_position)
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            return None
+        if min(row_position - row, row + 1 - row_position) < tolerance:
+            return None
+        if min(column_position - column, column + 1 - column_position) < tolerance:
+            return None
+        return row, column
+
+    def cell_of_extent(self, min_x, min_y, max_x, max_y, tolerance=1e-6):
+        """
+        Find (row, column) of the cell whose corners are the given WGS84 extent.
+
+        ::return :: (row, column), or None if the extent is not a cell of the lattice
+        ::return type :: (integer, integer)
+        """
+        try:
+            top, left = self.position(min_x, max_y)
+            bottom, right = self.position(max_x, min_y)
+        except ValueError:
+            return None
+
+        row, column = round(top), round(left)
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            return None
+        corners = ((top, row), (left, column), (bottom, row + 1), (right, column + 1))
+        if any(abs(position - expected) > tolerance for position, expected in corners):
+            return None
+        return row, column
+
+    def as_dict(self):
+        return {
+            'srid': self.srid,
+            'origin_x': self.origin_x,
+            'origin_y': self.origin_y,
+            'cell_width': self.cell_width,
+            'cell_height': self.cell_height,
+            'rows': self.rows,
+            'columns': self.columns,
+        }
+
+
+def rectangle_extent(geometry):
+    """
+    Extent of a polygon equal to its own bounding box, otherwise None.
+    """
+    if geometry is None or geometry.geom_type != 'Polygon' or len(geometry) != 1 \
+            or geometry.num_coords != 5:
+        return None
+    min_x, min_y, max_x, max_y = geometry.extent
+    if all(x in (min_x, max_x) and y in (min_y, max_y) for x, y in geometry.coords[0]):
+        return min_x, min_y, max_x, max_y
+    return None
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def fit_lattice(extents, srid, tolerance):
+    """
+    Fit a lattice to the rectangle extents in the given coordinate system.
+
+    ::return :: (Lattice, {grid ID: (row, column)})
+    """
+    projected = []
+    for grid_id, (min_x, min_y, max_x, max_y) in extents:
+        left, bottom = project(min_x, min_y, srid)
+        right, top = project(max_x, max_y, srid)
+        projected.append((grid_id, left, bottom, right, top))
+
+    cell_width = median(right - left for _, left, _, right, _ in projected)
+    cell_height = median(top - bottom for _, _, bottom, _, top in projected)
+    if cell_width <= 0 or cell_height <= 0:
+        return None, {}
+
+    def same_size(cell):
+        _, left, bottom, right, top = cell
+        return abs(right - left - cell_width) <= tolerance * cell_width \
+            and abs(top - bottom - cell_height) <= tolerance * cell_height
+
+    projected = [cell for cell in projected if same_size(cell)]
+    origin_x = min(left for _, left, _, _, _ in projected)
+    origin_y = max(top for _, _, _, _, top in projected)
+
+    cells = {}
+    taken = set()
+    # Highest ID first, so it keeps the slot when cells are duplicated
+    for grid_id, left, _, _, top in sorted(projected, reverse=True):
+        column_position = (left - origin_x) / cell_width
+        row_position = (origin_y - top) / cell_height
+        column, row = round(column_position), round(row_position)
+        if abs(column_position - column) > tolerance or abs(row_position - row) > tolerance:
+            continue
+        if (row, column) in taken:
+            continue
+        taken.add((row, column))
+        cells[grid_id] = (row, column)
+
+    if not cells:
+        return None, {}
+
+    lattice = Lattice(
+        srid,
+        origin_x,
+        origin_y,
+        cell_width,
+        cell_height,
+        max(row for row, _ in cells.values()) + 1,
+        max(column for _, column in cells.values()) + 1,
+    )
+    return lattice, cells
+
+
+def detect_lattice(grids, tolerance=1e-6, min_ratio=0.5):
+    """
+    Detect a regular lattice among grids, in Web Mercator or WGS84.
+    Irregular or clipped grids are left out of the lattice.
+
+    ::params::
+    grids : iterable of (grid ID, grid geometry)
+    tolerance : allowed difference from the lattice, as a fraction of cell size
+    min_ratio : minimum fraction of grids fitting the lattice
+
+    ::params type::
+    grids : iterable of (integer, GEOSGeometry)
+    tolerance : float
+    min_ratio : float
+
+    ::return :: (Lattice, {grid ID: (row, column)}), or (None, {}) if no lattice found
+    ::return type :: (Lattice, dict)
+    """
+    total = 0
+    extents = []
+    for grid_id, geometry in grids:
+        total += 1
+        extent = rectangle_extent(geometry)
+        if extent is not None:
+            extents.append((grid_id, extent))
+
+    if not extents:
+        return None, {}
+
+    best_lattice, best_cells = None, {}
+    for srid in (WEB_MERCATOR, WGS84):
+        lattice, cells = fit_lattice(extents, srid, tolerance)
+        if len(cells) > len(best_cells):
+            best_lattice, best_cells = lattice, cells
+
+    if len(best_cells) < total * min_ratio:
+        return None, {}
+    return best_lattice, best_cells
@@ -0,0 +1,177 @@
+from django.conf import settings
+from django.core.cache import caches
+from .tiles import tiles_covering
+import hashlib
+import time
+import uuid
+
+# Changed when every grid score may have changed, e.g. after generate_grid_score
+EPOCH_KEY = 'grid_score:epoch'
+
+# Tile buffer of mvt_tile, as a fraction of the tile size
+TILE_BUFFER = 64 / 4096
+
+# Maximum number of tile versions making the watermark of a region
+WATERMARK_MAX_TILES = 16
+
+
+def get_cache():
+    return caches[settings.GRID_SCORE_CACHE]
+
+
+def new_version():
+    """
+    Unique version token, starting with the time it was made.
+    """
+    return '{:.6f}:{}'.format(time.time(), uuid.uuid4().hex[:8])
+
+
+def version_time(version):
+    """
+    Timestamp of a version token.
+    """
+    return float(version.split(':', 1)[0])
+
+
+def tile_version_key(z, x, y):
+    return f'grid_score:tile_version:{z}/{x}/{y}'
+
+
+def get_versions(keys):
+    """
+    Return {key: version token} of the keys. Versions missing from the cache,
+    never set or evicted, are set to a new version, so data cached before
+    they went missing is not used anymore. When the cache does not keep them,
+    e.g. it is unreachable, new versions are returned: nothing is cached.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), None)
+        versions.update(cache.get_many(missing))
+        for key in missing:
+            if key not in versions:
+                versions[key] = new_version()
+    return versions
+
+
+def cached_tile(z, x, y, render):
+    """
+    Return the tile from the cache, rendering and caching it when missing.
+    Tiles are cached under the epoch and their own version, so a tile changed
+    while rendering is not cached over the newer version.
+
+    ::params::
+    render : callable returning the tile bytes
+
+    ::return type :: bytes
+    """
+    if z > settings.GRID_SCORE_TILE_CACHE_MAX_ZOOM:
+        return render()
+
+    cache = get_cache()
+    versions = get_versions([EPOCH_KEY, tile_version_key(z, x, y)])
+    key = 'grid_score:tile:{}/{}/{}:{}:{}'.format(
+        z, x, y, versions.get(EPOCH_KEY), versions.get(tile_version_key(z, x, y))
+    )
+    tile = cache.get(key)
+    if tile is None:
+        tile = render()
+        cache.set(key, tile)
+    return tile
+
+
+def cached_response_data(path, watermark, render):
+    """
+    Return response data of a grid score request from the cache,
+    rendering and caching it when missing. Data cached before the
+    watermark of the region of the request changed is not used anymore.
+
+    ::params::
+    path : full path of the request, with its query string
+    watermark : token of grid_score_watermark for the region of the request
+    render : callable returning the response data
+    """
+    cache = get_cache()
+    key = 'grid_score:response:{}:{}'.format(watermark, hashlib.md5(path.encode()).hexdigest())
+    data = cache.get(key)
+    if data is None:
+        data = render()
+        cache.set(key, data)
+    return data
+
+
+def watermark_tiles(min_x, min_y, max_x, max_y):
+    """
+    Tiles of the deepest cached zoom level covering the extent with at most
+    WATERMARK_MAX_TILES tiles.
+
+    ::return :: (z, [(x, y), ...])
+    """
+    tiles = [(0, 0)]
+    for z in range(1, settings.GRID_SCORE_TILE_CACHE_MAX_ZOOM + 1):
+        covering = list(tiles_covering(z, min_x, min_y, max_x, max_y))
+        if len(covering) > WATERMARK_MAX_TILES:
+            return z - 1, tiles
+        tiles = covering
+    return settings.GRID_SCORE_TILE_CACHE_MAX_ZOOM, tiles
+
+
+def grid_score_watermark(extent=None, tile=None):
+    """
+    Watermark of the grid scores in a WGS84 extent, in a tile, or everywhere.
+    It changes whenever a grid score there changes. Everywhere is the tile
+    of zoom level 0, covering every grid.
+
+    ::params::
+    extent : (min x, min y, max x, max y), or None
+    tile : (z, x, y) of a cached tile, or None
+
+    ::return :: (token, last modified timestamp)
+    ::return type :: (string, float)
+    """
+    keys = [EPOCH_KEY]
+    if tile is not None:
+        keys.append(tile_version_key(*tile))
+    elif extent is not None:
+        z, tiles = watermark_tiles(*extent)
+        keys.extend(tile_version_key(z, x, y) for x, y in tiles)
+    else:
+        keys.append(tile_version_key(0, 0, 0))
+
+    versions = get_versions(keys)
+    token = hashlib.md5(':'.join(versions[key] for key in keys).encode()).hexdigest()
+    return token, max(version_time(version) for version in versions.values())
+
+
+def invalidate_grid_score_extents(extents):
+    """
+    Invalidate the cached tiles covering the grid extents, and the cached
+    responses of regions overlapping them.
+    Everything is invalidated when there are more than GRID_SCORE_CACHE_MAX_EXTENTS extents.
+
+    ::params::
+    extents : iterable of WGS84 (min x, min y, max x, max y) of changed grids
+    """
+    extents = list(extents)
+    if len(extents) > settings.GRID_SCORE_CACHE_MAX_EXTENTS:
+        invalidate_grid_score_cache()
+        return
+
+    keys = set()
+    for extent in extents:
+        for z in range(settings.GRID_SCORE_TILE_CACHE_MAX_ZOOM + 1):
+            for x, y in tiles_covering(z, *extent, buffer=TILE_BUFFER):
+                keys.add(tile_version_key(z, x, y))
+
+    version = new_version()
+    get_cache().set_many({key: version for key in keys}, None)
+
+
+def invalidate_grid_score_cache():
+    """
+    Invalidate every cached tile and response.
+    """
+    get_cache().set(EPOCH_KEY, new_version(), None)
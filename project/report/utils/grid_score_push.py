@@ -0,0 +1,191 @@
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/grid-score/events'
+
+# Seconds between comments sent to keep idle connections open
+HEARTBEAT = 15
+
+# Events waiting for a client past this number mean it is too slow, it is disconnected
+MAX_PENDING_EVENTS = 100
+
+
+class GridScoreBroker(object):
+    """
+    In-process broker of grid score changes.
+    Changes are coalesced by grid score ID during `window` seconds,
+    then broadcast in one event to every subscriber, with the changes
+    cursor of /grid-score/changes/ they go up to.
+    """
+
+    def __init__(self, window=1.0, load_changes=None, cursor=None):
+        """
+        ::params::
+        window : seconds during which changes are coalesced
+        load_changes : coroutine function returning the changes from a cursor up to another,
+            sent to clients resuming from an event ID, or None
+        cursor : changes cursor the broker starts from
+        """
+        self.window = window
+        self.load_changes = load_changes
+        self.cursor = cursor
+        self.pending = {}
+        self.subscribers = set()
+
+    def publish(self, changes, cursor):
+        """
+        Add changes to the next event, a later change of a grid score replaces the earlier one.
+
+        ::params::
+        changes : iterable of dict with the grid score `id`
+        cursor : changes cursor the changes go up to
+        """
+        for change in changes:
+            self.pending[change['id']] = change
+        self.cursor = cursor
+
+    def subscribe(self):
+        """
+        Queue receiving the (cursor, list of changes) of each event.
+        """
+        queue = asyncio.Queue(MAX_PENDING_EVENTS)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def flush(self):
+        """
+        Broadcast the pending changes, if any.
+        """
+        if not self.pending:
+            return
+        event = (self.cursor, list(self.pending.values()))
+        self.pending = {}
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning('Grid score push subscriber too slow, disconnected')
+                self.unsubscribe(queue)
+
+    async def run(self):
+        """
+        Flush the pending changes every window, until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.window)
+            self.flush()
+
+
+def sse_event(cursor, changes):
+    """
+    Server-sent event of a list of changes, its ID is the changes cursor they go up to.
+    """
+    return 'id: {}\nevent: grid_score\ndata: {}\n\n'.format(cursor, json.dumps(changes)).encode()
+
+
+async def read_request(reader):
+    """
+    Read the request line and headers of an HTTP request.
+
+    ::return :: (method, path, {query parameter: value}, {lowercase header name: value})
+    """
+    parts = (await reader.readline()).decode('latin-1').split()
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if len(parts) < 2:
+        return None, None, {}, headers
+    url = urlsplit(parts[1])
+    params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+    return parts[0], url.path, params, headers
+
+
+def resume_cursor(params, headers):
+    """
+    Changes cursor a client resumes from: the ID of the last event it received,
+    sent again by EventSource when reconnecting, or the `since` query parameter,
+    e.g. the cursor of /grid-score/changes/. None when not given or invalid.
+    """
+    value = headers.get('last-event-id') or params.get('since')
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor >= 0 else None
+
+
+async def handle_sse_client(broker, reader, writer):
+    """
+    Answer one HTTP connection: stream the broker events to GET EVENTS_PATH, 404 otherwise.
+    Clients resuming from a cursor first get the changes since then.
+    """
+    try:
+        method, path, params, headers = await read_request(reader)
+        if method != 'GET' or path != EVENTS_PATH:
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await writer.drain()
+            return
+
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Access-Control-Allow-Origin: *\r\n'
+            b'Connection: keep-alive\r\n\r\n'
+        )
+        await writer.drain()
+
+        queue = broker.subscribe()
+        # Clients send nothing after the request, reading returns once they disconnect
+        disconnected = asyncio.ensure_future(reader.read(1024))
+        try:
+            since = resume_cursor(params, headers)
+            until = broker.cursor
+            if since is not None and until is not None and since < until and broker.load_changes is not None:
+                # Events from now on are queued while loading the missed changes
+                writer.write(sse_event(until, await broker.load_changes(since, until)))
+                await writer.drain()
+
+            # Until the client disconnects, or is too slow and unsubscribed by the broker
+            while queue in broker.subscribers and not disconnected.done():
+                event = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    (event, disconnected), timeout=HEARTBEAT, return_when=asyncio.FIRST_COMPLETED
+                )
+                if event in done:
+                    writer.write(sse_event(*event.result()))
+                else:
+                    event.cancel()
+                    if disconnected.done():
+                        break
+                    writer.write(b': heartbeat\n\n')
+                await writer.drain()
+        finally:
+            disconnected.cancel()
+            broker.unsubscribe(queue)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_sse_server(broker, host='0.0.0.0', port=8001):
+    """
+    Start the asyncio server of the grid score events, next to the WSGI app.
+
+    ::return type :: asyncio.AbstractServer
+    """
+    return await asyncio.start_server(
+        lambda reader, writer: handle_sse_client(broker, reader, writer), host, port
+    )
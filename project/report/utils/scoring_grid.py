@@ -1,3 +1,8 @@
+import numpy as np
+
+COLOR_WEIGHT = {'green': 1, 'yellow': 2, 'red': 5}
+
+
 def color_score_km_grid(user_report=0, population=0, color="green"):
     """
     color scoring km_grid based on count of a color
@@ -17,10 +22,24 @@ def color_score_km_grid(user_report=0, population=0, color="green"):
 
     ::return type :: integer
     """
-    weight = {'green': 1, 'yellow': 2, 'red': 5}
-    score = (1 / population) * (weight.get(color, '1') * user_report)
+    score = (1 / population) * (COLOR_WEIGHT.get(color, '1') * user_report)
     return score
 
+
+def round_score(score):
+    """
+    Round a color score to the 2 decimal digits it is stored with, half to even.
+    ColorScore rounds the same way in SQL, PostgreSQL would round half away
+    from zero when casting to numeric, so incremental and batch scores agree.
+
+    ::params::
+    score : color score
+
+    ::return type :: float
+    """
+    return round(score * 100) / 100
+
+
 def status_score_km_grid(
         user_report_green=0,
         user_report_yellow=0,
@@ -83,3 +102,112 @@ def status_score_km_grid(
         status_score = 2
 
     return status_score
+
+
+def color_score_km_grid_batch(user_report, population, color="green"):
+    """
+    color scoring many km_grid at once, vectorized version of color_score_km_grid
+
+    ::params::
+    user_report : count report of a color in each grid
+    population : number of population in each grid
+    color : color code of status (green, yellow, red)
+
+    ::params type::
+    user_report : sequence or array of integer
+    population : sequence or array of integer
+    color : string
+
+    ::return :: score for the color of each grid
+    ::return type :: numpy array of float
+    """
+    population = np.asarray(population, dtype=np.int64)
+    if (population == 0).any():
+        raise ZeroDivisionError('division by zero')
+    user_report = np.asarray(user_report, dtype=np.int64)
+    return (1 / population) * (COLOR_WEIGHT[color] * user_report)
+
+
+def status_score_km_grid_batch(
+        user_report_green,
+        user_report_yellow,
+        user_report_red,
+        population,
+        error_allowed=0.0,
+        estimated_respondent=0.1):
+    """
+    scoring many km_grid at once, vectorized version of status_score_km_grid
+
+    ::params::
+    user_report_green : count of green report in each grid
+    user_report_yellow : count of yellow report in each grid
+    user_report_red : count of red report in each grid
+    population : number of population in each grid
+    error_allowed : minimum percentage respondent of population required
+    estimated_respondent : estimated percentage respondent of population
+
+    ::params type::
+    user_report_green : sequence or array of integer
+    user_report_yellow : sequence or array of integer
+    user_report_red : sequence or array of integer
+    populaton : sequence or array of integer
+    error_allowed : float
+    estimated_respondent : float
+
+    ::return :: status of each km_grid (0: green, 1: yellow, 2: red)
+    ::return type :: numpy array of integer
+    """
+    user_report_green = np.asarray(user_report_green, dtype=np.int64)
+    user_report_yellow = np.asarray(user_report_yellow, dtype=np.int64)
+    user_report_red = np.asarray(user_report_red, dtype=np.int64)
+    population = np.asarray(population, dtype=np.int64)
+    population = np.where(population == 0, 1, population)
+    number_of_sample = user_report_green + user_report_yellow + user_report_red
+
+    score = color_score_km_grid_batch(user_report_red, population, 'red') \
+        + color_score_km_grid_batch(user_report_yellow, population, 'yellow') \
+        - color_score_km_grid_batch(user_report_green, population, 'green')
+
+    max_score_estimated = (1 / population) * (5 * estimated_respondent * population)
+    min_score_estimated = (1 / population) * (-1 * estimated_respondent * population)
+
+    # setpoint red zone
+    setpoint_red_zone = (1 / 3) * (max_score_estimated - min_score_estimated)
+
+    status_score = np.where(score < setpoint_red_zone, 1, 2)
+    status_score[population <= 0] = 0
+    status_score[number_of_sample < population * error_allowed] = 0
+    status_score[(user_report_yellow == 0) & (user_report_red == 0)] = 0
+
+    return status_score
+
+
+def score_km_grid_batch(
+        user_report_green,
+        user_report_yellow,
+        user_report_red,
+        population,
+        error_allowed=0.0,
+        estimated_respondent=0.1):
+    """
+    Score of every color and total status of many km_grid in one call
+
+    ::params:: see status_score_km_grid_batch
+
+    ::return :: {'score_green', 'score_yellow', 'score_red': array of float,
+        'total_score': array of integer}
+    ::return type :: dict
+    """
+    return {
+        'score_green': color_score_km_grid_batch(user_report_green, population, 'green'),
+        'score_yellow': color_score_km_grid_batch(user_report_yellow, population, 'yellow'),
+        'score_red': color_score_km_grid_batch(user_report_red, population, 'red'),
+        'total_score': status_score_km_grid_batch(
+            user_report_green,
+            user_report_yellow,
+            user_report_red,
+            population,
+            error_allowed,
+            estimated_respondent
+        ),
+    }
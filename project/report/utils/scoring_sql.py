@@ -0,0 +1,101 @@
+from django.db.models import FloatField, Func
+from .scoring_grid import COLOR_WEIGHT
+import re
+
+PLACEHOLDER = re.compile(r'{(\w+)}')
+
+
+def render_sql(template, arguments):
+    """
+    Render SQL template whose {name} placeholders can appear several times.
+
+    ::params::
+    template : SQL with {name} placeholders
+    arguments : {name: (sql, params)}
+
+    ::return :: (sql, params) with params repeated in placeholder order
+    ::return type :: (string, list)
+    """
+    params = []
+
+    def replace(match):
+        sql, argument_params = arguments[match.group(1)]
+        params.extend(argument_params)
+        return sql
+
+    return PLACEHOLDER.sub(replace, template), params
+
+
+def float_argument(value):
+    return '%s::double precision', [float(value)]
+
+
+# Population of 0 is counted as 1, like status_score_km_grid
+POPULATION_SQL = '(CASE WHEN {population} = 0 THEN 1 ELSE {population} END)'
+
+
+class ColorScore(Func):
+    """
+    SQL version of color_score_km_grid, to score a grid inside an UPDATE.
+    Rounded like round_score, rint of double precision rounds half to even.
+    """
+    output_field = FloatField()
+
+    def __init__(self, user_report, population, color='green'):
+        super().__init__(user_report, population)
+        self.color = color
+
+    def as_sql(self, compiler, connection, **extra_context):
+        user_report, population = self.get_source_expressions()
+        return render_sql(
+            '(round((1.0::double precision / ' + POPULATION_SQL + ')'
+            ' * ({weight} * {user_report}) * 100) / 100)',
+            {
+                'user_report': compiler.compile(user_report),
+                'population': compiler.compile(population),
+                'weight': ('%s', [COLOR_WEIGHT[self.color]]),
+            }
+        )
+
+
+class StatusScore(Func):
+    """
+    SQL version of status_score_km_grid, to score a grid inside an UPDATE.
+    Floating point operations are done in the same order as the Python version.
+    """
+    output_field = FloatField()
+
+    def __init__(self, user_report_green, user_report_yellow, user_report_red, population,
+                 error_allowed=0.0, estimated_respondent=0.1):
+        super().__init__(user_report_green, user_report_yellow, user_report_red, population)
+        self.error_allowed = error_allowed
+        self.estimated_respondent = estimated_respondent
+
+    def as_sql(self, compiler, connection, **extra_context):
+        green, yellow, red, population = self.get_source_expressions()
+        population_sql, population_params = render_sql(
+            POPULATION_SQL, {'population': compiler.compile(population)}
+        )
+        template = (
+            '(CASE'
+            ' WHEN {population} <= 0 THEN 0'
+            ' WHEN ({green} + {yellow} + {red}) < {population} * {error_allowed} THEN 0'
+            ' WHEN {yellow} = 0 AND {red} = 0 THEN 0'
+            ' WHEN (1.0::double precision / {population}) * (5 * {red})'
+            ' + (1.0::double precision / {population}) * (2 * {yellow})'
+            ' - (1.0::double precision / {population}) * (1 * {green})'
+            ' < (1.0::double precision / 3) * ('
+            '(1.0::double precision / {population}) * ({max_respondent} * {population})'
+            ' - (1.0::double precision / {population}) * ({min_respondent} * {population})'
+            ') THEN 1'
+            ' ELSE 2 END)'
+        )
+        return render_sql(template, {
+            'green': compiler.compile(green),
+            'yellow': compiler.compile(yellow),
+            'red': compiler.compile(red),
+            'population': (population_sql, population_params),
+            'error_allowed': float_argument(self.error_allowed),
+            'max_respondent': float_argument(5 * self.estimated_respondent),
+            'min_respondent': float_argument(-1 * self.estimated_respondent),
+        })
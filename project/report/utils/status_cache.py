@@ -0,0 +1,47 @@
+from django.conf import settings
+import threading
+import time
+
+# Rendered responses of the status endpoint, {key: (response, rendered at)}
+_status_responses = {}
+_status_responses_generation = 0
+_status_responses_lock = threading.Lock()
+
+# Any path can be requested, the responses are dropped past this number
+MAX_STATUS_RESPONSES = 100
+
+
+def status_response(key, render):
+    """
+    Return the process-local response of the status endpoint, rendering it when needed.
+    It is rendered again after STATUS_CACHE_TTL seconds, or once a status is saved or deleted.
+
+    ::params::
+    key : full path of the request
+    render : callable returning the response
+    """
+    with _status_responses_lock:
+        cached = _status_responses.get(key)
+        generation = _status_responses_generation
+    if cached is not None and time.monotonic() - cached[1] <= settings.STATUS_CACHE_TTL:
+        return cached[0]
+
+    response = render()
+    with _status_responses_lock:
+        # Not kept when a status changed while rendering
+        if generation == _status_responses_generation:
+            if len(_status_responses) >= MAX_STATUS_RESPONSES:
+                _status_responses.clear()
+            _status_responses[key] = (response, time.monotonic())
+    return response
+
+
+def invalidate_status_responses():
+    """
+    Drop the process-local status responses so the next request renders them again.
+    """
+    global _status_responses_generation
+
+    with _status_responses_lock:
+        _status_responses.clear()
+        _status_responses_generation += 1
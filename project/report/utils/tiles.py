@@ -0,0 +1,74 @@
+import math
+
+# Half the width of the Web Mercator world, in meters
+WEB_MERCATOR_EXTENT = 20037508.342789244
+MAX_ZOOM = 24
+
+
+def valid_tile(z, x, y):
+    """
+    Check the tile coordinates exist at this zoom level.
+    """
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """
+    Web Mercator bounds of a XYZ tile.
+
+    ::return :: (min x, min y, max x, max y) in meters
+    ::return type :: (float, float, float, float)
+    """
+    size = 2 * WEB_MERCATOR_EXTENT / 2 ** z
+    min_x = -WEB_MERCATOR_EXTENT + x * size
+    max_y = WEB_MERCATOR_EXTENT - y * size
+    return min_x, max_y - size, min_x + size, max_y
+
+
+def tile_position(z, longitude, latitude):
+    """
+    Fractional (x, y) tile position of a WGS84 coordinate.
+    """
+    n = 2 ** z
+    latitude = max(min(latitude, 85.0511287798), -85.0511287798)
+    x = (longitude + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def tile_for_point(z, longitude, latitude):
+    """
+    (x, y) of the XYZ tile containing a WGS84 coordinate.
+    """
+    x, y = tile_position(z, longitude, latitude)
+    return int(x), int(y)
+
+
+def tiles_covering(z, min_x, min_y, max_x, max_y, buffer=0.0):
+    """
+    XYZ tiles covering a WGS84 extent at a zoom level.
+
+    ::params::
+    buffer : tile buffer as a fraction of the tile size, features within the
+        buffer of a tile are rendered in it too
+
+    ::return :: (x, y) of each tile
+    ::return type :: generator of (integer, integer)
+    """
+    last = 2 ** z - 1
+    left, top = tile_position(z, min_x, max_y)
+    right, bottom = tile_position(z, max_x, min_y)
+    for x in range(max(math.floor(left - buffer), 0), min(math.floor(right + buffer), last) + 1):
+        for y in range(max(math.floor(top - buffer), 0), min(math.floor(bottom + buffer), last) + 1):
+            yield x, y
+
+
+def tile_max_age(z, max_age_by_zoom):
+    """
+    Cache duration of a tile, from {minimum zoom level: seconds}.
+    The entry with the highest zoom level not above `z` is used.
+    """
+    zoom_levels = [zoom for zoom in max_age_by_zoom if zoom <= z]
+    if not zoom_levels:
+        return 0
+    return max_age_by_zoom[max(zoom_levels)]
@@ -1,18 +1,114 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from django_filters import rest_framework as filters
 from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAdminUser, AllowAny
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework_gis.filters import InBBoxFilter
 from .models.status import Status
-from .models.report import Report
+from .models.report import Report, bulk_create_reports
+from .models.queued_report import QueuedReport
 from .models.km_grid import KmGrid
-from .models.km_grid_score import KmGridScore
+from .models.km_grid_score import KmGridScore, changes_cursor, mvt_tile
+from .models.km_grid_score_deletion import KmGridScoreDeletion
 from .models.user import User
+from .parsers import NDJSONParser
+from .renderers import MVTRenderer
+from .utils.geojson_stream import write_feature_collection
+from .utils.grid_score_cache import cached_response_data, cached_tile, grid_score_watermark
+from .utils.grid_index import invalidate_grid_index
+from .utils.status_cache import status_response
+from .utils.geometry_output import GEOMETRY_SHAPES, MAX_PRECISION, POLYGON, GeometryOutput, zoom_precision
+from .utils.tiles import MAX_ZOOM, valid_tile, tile_max_age
 from .filters import KmGridFilter, KmGridScoreFilter, ReportFilter, StatusFilter
 from .serializers import StatusSerializer, ReportSerializer, ReportCreateSerializer,\
     ReportRetrieveListSerializer, UserSerializer, KmGridSerializer,\
     KmGridScoreSerializer
+import hashlib
 import json
+import math
+import time
+
+# Cursors of /grid-score/changes/ are 64 bits transaction IDs
+MAX_CHANGES_CURSOR = 2 ** 63 - 1
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Check the client already has the response with the ETag, or modified at
+    the last_modified timestamp, from the If-None-Match or If-Modified-Since header.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+    if last_modified is None:
+        return False
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def bbox_extent(request):
+    """
+    (min x, min y, max x, max y) of the `in_bbox` query parameter, or None.
+    """
+    try:
+        x1, y1, x2, y2 = (float(value) for value in request.query_params['in_bbox'].split(','))
+    except (KeyError, ValueError):
+        return None
+    if not all(math.isfinite(value) for value in (x1, y1, x2, y2)):
+        return None
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def integer_param(request, name, minimum, maximum, default=None):
+    """
+    Integer query parameter between minimum and maximum, or default when not given.
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        value = None
+    if value is None or not minimum <= value <= maximum:
+        raise ValidationError({name: [f'Expected an integer between {minimum} and {maximum}.']})
+    return value
+
+
+def geometry_output(request):
+    """
+    GeometryOutput from the `geometry`, `zoom` and `precision` query parameters.
+    Precision defaults to what the zoom level needs, or GEOJSON_PRECISION.
+    """
+    shape = request.query_params.get('geometry', POLYGON)
+    if shape not in GEOMETRY_SHAPES:
+        raise ValidationError({'geometry': ['Expected one of {}.'.format(', '.join(GEOMETRY_SHAPES))]})
+    zoom = integer_param(request, 'zoom', 0, MAX_ZOOM)
+    default_precision = settings.GEOJSON_PRECISION if zoom is None else zoom_precision(zoom)
+    precision = integer_param(request, 'precision', 0, MAX_PRECISION, default_precision)
+    return GeometryOutput(shape, precision, zoom)
+
+
+class GeometryOutputMixin(object):
+    """
+    Write the geometry of listed grids as asked by the `geometry`, `zoom`
+    and `precision` query parameters, see GeometryOutput.
+    """
+    geometry_output_params = ('geometry', 'zoom', 'precision')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        params = self.request.query_params
+        if self.action == 'list' and any(param in params for param in self.geometry_output_params):
+            queryset = geometry_output(self.request).annotate(queryset)
+        return queryset
 
 
 class StatusViewSet(mixins.RetrieveModelMixin,
@@ -35,6 +131,42 @@ class StatusViewSet(mixins.RetrieveModelMixin,
     queryset = Status.objects.all()
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = StatusFilter
+    # Statuses are public, skipping authentication lets cached responses skip the database
+    authentication_classes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(StatusViewSet, self).list(request, *args, **kwargs).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(StatusViewSet, self).retrieve(request, *args, **kwargs).data
+        )
+
+    def cached_response(self, request, render):
+        """
+        Response from the process-local status cache, with a strong ETag
+        of its content and the media type it is rendered to.
+        304 Not Modified when the client already has it.
+        """
+        def render_with_digest():
+            data = render()
+            content = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+            return hashlib.md5(content).hexdigest(), data
+
+        digest, data = status_response(request.build_absolute_uri(), render_with_digest)
+        etag = quote_etag(
+            hashlib.md5(f'{request.accepted_renderer.media_type}:{digest}'.encode()).hexdigest()
+        )
+        if not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.STATUS_MAX_AGE)
+        patch_vary_headers(response, ('Accept',))
+        return response
 
 
 class ReportViewSet(mixins.RetrieveModelMixin,
@@ -56,6 +188,15 @@ class ReportViewSet(mixins.RetrieveModelMixin,
 
     create:
         Create new Report.
+        <br>
+        When report ingestion mode is `queue`, the Report is queued and created later,
+        the response is 202 Accepted with the ID the Report will have.
+
+    bulk:
+        Create many Reports at once, from a JSON array or NDJSON (application/x-ndjson) body.
+        <br>
+        Each item has the same fields as create. The response lists the result of each item,
+        in the same order.
 
     destroy:
         Delete Report object.
@@ -70,22 +211,138 @@ class ReportViewSet(mixins.RetrieveModelMixin,
 
     def create(self, request, *args, **kwargs):
         try:
-            grid = KmGrid.objects.geometry_contains(
-                json.dumps(request.data['location'])
-            )
-            if grid.count() > 0:
-                request.data['grid'] = grid.first().id
+            location = json.dumps(request.data['location'])
+            grid_id = KmGrid.objects.grid_id_contains(location)
+            if grid_id is not None:
+                request.data['grid'] = grid_id
 
             serializer = ReportSerializer(data=request.data)
+            if grid_id is not None and not serializer.is_valid() and 'grid' in serializer.errors:
+                # The grid index still has a grid deleted by another process
+                invalidate_grid_index()
+                request.data['grid'] = KmGrid.objects.grid_id_contains(location)
+                serializer = ReportSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
         except Exception as e:
             print(e)
             return Response({}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        if settings.REPORT_INGESTION_MODE == 'queue':
+            return self.enqueue(serializer)
+
         mixins.CreateModelMixin.perform_create(self, serializer)
         headers = mixins.CreateModelMixin.get_success_headers(self, serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def enqueue(self, serializer):
+        """
+        Queue the validated report, to be applied later by the report queue worker.
+        The response contains the ID the report will have.
+        """
+        queued_report = QueuedReport.objects.enqueue(
+            grid=serializer.validated_data.get('grid'),
+            status=serializer.validated_data['status'],
+            user=serializer.validated_data['user']
+        )
+        report = Report(
+            id=queued_report.report_id,
+            grid=queued_report.grid,
+            status=queued_report.status,
+            user=queued_report.user,
+            timestamp=queued_report.timestamp,
+            current=True
+        )
+        return Response(ReportSerializer(report).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Create many reports with one grid lookup query, one bulk INSERT
+        and one grid score UPDATE per grid.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of reports.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > settings.REPORT_BULK_MAX_SIZE:
+            return Response(
+                {'detail': f'At most {settings.REPORT_BULK_MAX_SIZE} reports can be sent at once.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(items)
+        valid_items = []
+        for num, item in enumerate(items):
+            serializer = ReportCreateSerializer(data=item)
+            if not serializer.is_valid():
+                results[num] = self.bulk_error(num, serializer.errors)
+            elif serializer.validated_data['location'].geom_type != 'Point':
+                results[num] = self.bulk_error(num, {'location': ['Location must be a Point.']})
+            else:
+                valid_items.append((num, serializer.validated_data))
+
+        status_ids = set(Status.objects.filter(
+            id__in={data['status'] for _, data in valid_items}
+        ).values_list('id', flat=True))
+        user_ids = set(User.objects.filter(
+            id__in={data['user'] for _, data in valid_items}
+        ).values_list('id', flat=True))
+
+        new_items = []
+        for num, data in valid_items:
+            errors = {}
+            if data['status'] not in status_ids:
+                errors['status'] = [f'Invalid pk "{data["status"]}" - object does not exist.']
+            if data['user'] not in user_ids:
+                errors['user'] = [f'Invalid pk "{data["user"]}" - object does not exist.']
+            if errors:
+                results[num] = self.bulk_error(num, errors)
+            else:
+                new_items.append((num, data))
+
+        grid_ids = self.bulk_grid_ids([(data['location'].x, data['location'].y) for _, data in new_items])
+        reports = bulk_create_reports([
+            Report(grid_id=grid_id, status_id=data['status'], user_id=data['user'])
+            for (_, data), grid_id in zip(new_items, grid_ids)
+        ])
+        for (num, _), report in zip(new_items, reports):
+            results[num] = {
+                'index': num,
+                'status': status.HTTP_201_CREATED,
+                'id': report.id,
+                'grid': report.grid_id,
+            }
+
+        return Response({
+            'created': len(reports),
+            'failed': len(items) - len(reports),
+            'results': results,
+        })
+
+    def bulk_grid_ids(self, coordinates):
+        """
+        ID of the grid containing each coordinate, like grid_ids_contain.
+        The grid index may still have grids deleted by another process,
+        the coordinates located in a grid that no longer exists are looked up again
+        once the index is invalidated.
+        """
+        grid_ids = KmGrid.objects.grid_ids_contain(coordinates)
+        used_grid_ids = set(grid_ids) - {None}
+        deleted = used_grid_ids - set(
+            KmGrid.objects.filter(id__in=used_grid_ids).values_list('id', flat=True)
+        )
+        if deleted:
+            invalidate_grid_index()
+            stale = [num for num, grid_id in enumerate(grid_ids) if grid_id in deleted]
+            located = KmGrid.objects.grid_ids_contain([coordinates[num] for num in stale])
+            for num, grid_id in zip(stale, located):
+                grid_ids[num] = grid_id
+        return grid_ids
+
+    def bulk_error(self, num, errors):
+        return {'index': num, 'status': status.HTTP_400_BAD_REQUEST, 'errors': errors}
+
     def get_permissions(self):
         """
         Get permission object for certain action
@@ -102,14 +359,15 @@ class ReportViewSet(mixins.RetrieveModelMixin,
         :return: Serializer class
         """
         serializer_class = ReportSerializer
-        if self.action == 'create':
+        if self.action in ['create', 'bulk']:
             serializer_class = ReportCreateSerializer
         if self.action in ['retrieve', 'list']:
             serializer_class = ReportRetrieveListSerializer
         return serializer_class
 
 
-class KmGridViewSet(mixins.RetrieveModelMixin,
+class KmGridViewSet(GeometryOutputMixin,
+                    mixins.RetrieveModelMixin,
                     mixins.ListModelMixin,
                     viewsets.GenericViewSet):
     """
@@ -134,7 +392,8 @@ class KmGridViewSet(mixins.RetrieveModelMixin,
     filterset_class = KmGridFilter
 
 
-class KmGridScoreViewSet(mixins.RetrieveModelMixin,
+class KmGridScoreViewSet(GeometryOutputMixin,
+                         mixins.RetrieveModelMixin,
                          mixins.ListModelMixin,
                          viewsets.GenericViewSet):
     """
@@ -148,6 +407,16 @@ class KmGridScoreViewSet(mixins.RetrieveModelMixin,
         <br>
         Parameter <strong>page</strong> indicates the page number.
         Each page consists of 100 objects
+
+    tile:
+        Show KmGridScore of a XYZ tile as Mapbox Vector Tile.
+        <br>
+        Layer <strong>grid_score</strong> has total_score, total_report and the count of each color.
+
+    changes:
+        Show KmGridScore changed since the <strong>since</strong> cursor, and the ID of the deleted ones.
+        <br>
+        Parameter <strong>since</strong> is the cursor of the previous response, 0 the first time.
     """
 
     serializer_class = KmGridScoreSerializer
@@ -157,17 +426,123 @@ class KmGridScoreViewSet(mixins.RetrieveModelMixin,
     filterset_class = KmGridScoreFilter
 
     def list(self, request, *args, **kwargs):
+        """
+        Paginated responses are cached until a grid score of the `in_bbox` region,
+        or of everywhere, changes, see grid_score_cache. Without pagination, features
+        are serialized by PostgreSQL and streamed from a server-side cursor,
+        so the memory used does not grow with the result.
+        Clients having the latest response of an `in_bbox` region, or of everywhere,
+        get 304 Not Modified.
+        """
+        watermark = grid_score_watermark(extent=bbox_extent(request))
+        return self.conditional_response(
+            request,
+            watermark,
+            lambda: self.list_response(request, watermark[0])
+        )
+
+    def list_response(self, request, watermark):
         if 'no_page' in request.query_params:
-            self.pagination_class = None
-        queryset = self.filter_queryset(self.get_queryset())
+            output = geometry_output(request)
+            features = self.filter_queryset(self.get_queryset()).geojson_features(output)
+            return StreamingHttpResponse(
+                write_feature_collection(features.iterator(chunk_size=settings.GEOJSON_STREAM_CHUNK_SIZE)),
+                content_type='application/json'
+            )
+        return Response(
+            cached_response_data(request.get_full_path(), watermark, lambda: self.list_data(request))
+        )
 
+    @action(detail=False, methods=['get'])
+    def changes(self, request, *args, **kwargs):
+        """
+        Stream the grid scores changed since the cursor, oldest change first,
+        in a FeatureCollection with the next `cursor` and the `deleted` grid score IDs.
+        Only `in_bbox` and the geometry options of list are allowed: a grid score
+        changed out of a filter on its values would be neither in the features
+        nor deleted, and stay stale in the client copy.
+        """
+        filter_params = [param for param in KmGridScoreFilter.base_filters if param in request.query_params]
+        if filter_params:
+            raise ValidationError({
+                param: ['Not allowed on changes, only in_bbox is.'] for param in filter_params
+            })
+        since = integer_param(request, 'since', 0, MAX_CHANGES_CURSOR, 0)
+        output = geometry_output(request)
+        cursor = changes_cursor()
+
+        deleted = list(
+            KmGridScoreDeletion.objects.filter(
+                version__gte=since, version__lt=cursor
+            ).values_list('grid_score_id', flat=True).distinct()
+        )
+        features = InBBoxFilter().filter_queryset(request, self.get_queryset(), self).changed_since(
+            since, cursor
+        ).order_by('version', 'id').geojson_features(output)
+        return StreamingHttpResponse(
+            write_feature_collection(
+                features.iterator(chunk_size=settings.GEOJSON_STREAM_CHUNK_SIZE),
+                members={'cursor': cursor, 'deleted': deleted}
+            ),
+            content_type='application/json'
+        )
+
+    def list_data(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data).data
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+    def tile(self, request, z, x, y, *args, **kwargs):
+        """
+        Render the tile with PostGIS, or get it from the grid score cache.
+        Tiles can be cached by clients for a duration depending on the zoom level,
+        see GRID_SCORE_TILE_MAX_AGE.
+        """
+        z, x, y = int(z), int(x), int(y)
+        if not valid_tile(z, x, y):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        if z > settings.GRID_SCORE_TILE_CACHE_MAX_ZOOM:
+            response = Response(mvt_tile(z, x, y))
+        else:
+            response = self.conditional_response(
+                request,
+                grid_score_watermark(tile=(z, x, y)),
+                lambda: Response(cached_tile(z, x, y, lambda: mvt_tile(z, x, y)))
+            )
+        max_age = tile_max_age(z, settings.GRID_SCORE_TILE_MAX_AGE)
+        if max_age:
+            patch_cache_control(response, public=True, max_age=max_age)
+        return response
+
+    def conditional_response(self, request, watermark, respond):
+        """
+        304 Not Modified when the client has the response of the current watermark,
+        without querying grid scores, or the response of `respond`.
+        Both have the ETag of the watermark and the rendered media type, and its
+        Last-Modified once the second of the watermark is over: Last-Modified has
+        whole seconds, a change later in the same second would have the same Last-Modified.
+        """
+        token, last_modified = watermark
+        etag = quote_etag(hashlib.md5(
+            f'{token}:{request.accepted_renderer.media_type}:{request.get_full_path()}'.encode()
+        ).hexdigest())
+        last_modified = math.ceil(last_modified)
+        if not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = respond()
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept',))
+        if time.time() >= last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_renderers(self):
+        if self.action == 'tile':
+            return [MVTRenderer()]
+        return super().get_renderers()
 
 
 class UserViewSet(mixins.ListModelMixin,
@@ -18,6 +18,8 @@ router.register(r'grid', KmGridViewSet)
 router.register(r'grid-score', KmGridScoreViewSet)
 router.register(r'user', UserViewSet)
 
+grid_score_tile = KmGridScoreViewSet.as_view({'get': 'tile'})
+
 schema_view = get_schema_view(
     openapi.Info(
         title="How Am I Doing? API",
@@ -40,6 +42,11 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(
+        r'^api/v1/grid-score/tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$',
+        grid_score_tile,
+        name='kmgridscore-tile'
+    ),
     path('api/v1/', include(router.urls)),
     path('api-token-auth/', views.obtain_auth_token),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),